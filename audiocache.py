@@ -0,0 +1,270 @@
+""" Audio cache module for discord.py bot.
+
+Stores downloaded audio streams on disk so looped and popular tracks play from a local file instead of being streamed again.
+Files are keyed by canonical webpage URL and evicted least recently used first once the cache grows past its size limit. 
+A file name can end with a suffix recording how its audio is encoded (e.g. `.opus`), as streams of the same track may change format. """
+
+from init.logutils import log, log_to_discord_log
+
+from collections import OrderedDict
+from hashlib import sha256
+from logging import Logger
+from os import makedirs, remove, replace, scandir, utime
+from os.path import join
+from threading import Lock
+from typing import BinaryIO
+
+_PARTIAL_FILE_SUFFIX = ".part"
+
+def _get_name_hash(name: str) -> str:
+    """ Return the key hash of cache file `name`, without its suffix. """
+
+    return name.split(".", 1)[0]
+
+class AudioCache:
+    """ Thread-safe, byte-capped LRU cache of audio files stored in directory `path`.
+
+    `max_size`: Maximum total size of cached files in bytes.
+
+    `get()` and `open_fill()` only touch the in-memory index. `AudioCacheFill` methods and `close()` write to disk
+    and must be sent to a thread if working with an asyncio loop.
+
+    File system errors are logged and treated as cache misses. """
+
+    def __init__(self, path: str, max_size: int, can_log: bool=False, logger: Logger | None=None):
+        self.path = path
+        self.max_size = max_size
+        self.can_log = can_log
+        self.logger = logger
+
+        self._lock = Lock()
+        self._entries = OrderedDict() # File name -> size in bytes, least recently used first
+        self._names = {} # Key hash -> file name
+        self._size = 0
+        self._filling = set()
+        self._used = set() # Files returned by get() since startup, their timestamps are updated by close()
+
+        makedirs(path, exist_ok=True)
+        self._load()
+
+    def _handle_error(self, error: Exception) -> None:
+        log(f"An error occurred while accessing audio cache {self.path}\nErr: {error}")
+        log_to_discord_log(error, can_log=self.can_log, logger=self.logger)
+
+    def _load(self) -> None:
+        """ Index the files already in the cache directory by last use, delete leftover partial files and evict files over the size limit. """
+
+        files = []
+        with scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+
+                if entry.name.endswith(_PARTIAL_FILE_SUFFIX):
+                    self._remove_file(entry.name)
+                    continue
+
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        with self._lock:
+            for _, name, size in sorted(files):
+                digest = _get_name_hash(name)
+                if digest in self._names and self._remove_file(self._names[digest]): # Older file of the same key
+                    self._size -= self._entries.pop(self._names[digest])
+
+                self._names[digest] = name
+                self._entries[name] = size
+                self._size += size
+
+            self._evict()
+
+    def _remove_file(self, name: str) -> bool:
+        try:
+            remove(join(self.path, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self._handle_error(e)
+            return False
+
+        return True
+
+    def _evict(self) -> None:
+        """ Delete least recently used files until the cache fits in `max_size`. Must be called with the lock held. """
+
+        for name in list(self._entries):
+            if self._size <= self.max_size:
+                break
+
+            if self._remove_file(name):
+                self._size -= self._entries.pop(name)
+
+                digest = _get_name_hash(name)
+                if self._names.get(digest) == name:
+                    del self._names[digest]
+
+    @property
+    def size(self) -> int:
+        """ Total size of cached files in bytes. """
+
+        with self._lock:
+            return self._size
+
+    def get_key_hash(self, key: str) -> str:
+        """ Return the hash of `key` file names start with. """
+
+        return sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """ Return the path of the file cached under `key` and mark it as recently used, or None if not cached. 
+        
+        The path ends with the suffix given to `open_fill()`, if any. """
+
+        with self._lock:
+            name = self._names.get(self.get_key_hash(key))
+            if name is None:
+                return None
+
+            self._entries.move_to_end(name)
+            self._used.add(name)
+
+        return join(self.path, name)
+
+    def close(self) -> None:
+        """ Update the timestamps of files used since startup in least recently used order, so the LRU order survives restarts. """
+
+        with self._lock:
+            used = [name for name in self._entries if name in self._used]
+            self._used.clear()
+
+        for name in used:
+            try:
+                utime(join(self.path, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._handle_error(e)
+
+    def open_fill(self, key: str, suffix: str="") -> "AudioCacheFill | None":
+        """ Return an `AudioCacheFill` writing the audio of `key` to the cache in a file ending with `suffix` (e.g. `.opus`),
+        or None if `key` is already cached or being written by another fill. """
+
+        digest = self.get_key_hash(key)
+
+        with self._lock:
+            if digest in self._names or digest in self._filling:
+                return None
+
+            self._filling.add(digest)
+
+        return AudioCacheFill(self, digest + suffix)
+
+    def _commit(self, name: str, size: int) -> bool:
+        partial_path = join(self.path, name + _PARTIAL_FILE_SUFFIX)
+
+        try:
+            replace(partial_path, join(self.path, name))
+        except OSError as e:
+            self._handle_error(e)
+            self._abort(name)
+            return False
+
+        digest = _get_name_hash(name)
+
+        with self._lock:
+            self._filling.discard(digest)
+            self._names[digest] = name
+            self._entries[name] = size
+            self._size += size
+            self._evict()
+
+        return True
+
+    def _abort(self, name: str) -> None:
+        self._remove_file(name + _PARTIAL_FILE_SUFFIX)
+
+        with self._lock:
+            self._filling.discard(_get_name_hash(name))
+
+class AudioCacheFill:
+    """ A file being written to an `AudioCache`. Only becomes visible to `AudioCache.get()` once committed.
+
+    Thread-safe: a write still running in a thread when the fill is aborted either completes first or does nothing.
+
+    Writes past the cache's `max_size` abort the fill, as the file could never be kept. """
+
+    def __init__(self, cache: AudioCache, name: str):
+        self.cache = cache
+        self.name = name
+        self.size = 0
+
+        self._lock = Lock()
+        self._file: BinaryIO | None = None
+        self._done = False
+
+    def write(self, data: bytes) -> None:
+        """ Append `data` to the file. Does nothing once the fill is aborted or committed. """
+
+        with self._lock:
+            if self._done:
+                return
+
+            if self.size + len(data) > self.cache.max_size:
+                self._abort()
+                return
+
+            try:
+                if self._file is None:
+                    self._file = open(join(self.cache.path, self.name + _PARTIAL_FILE_SUFFIX), "wb")
+
+                self._file.write(data)
+            except OSError as e:
+                self.cache._handle_error(e)
+                self._abort()
+                return
+
+            self.size += len(data)
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+
+        try:
+            self._file.close()
+        except OSError as e:
+            self.cache._handle_error(e)
+
+        self._file = None
+
+    def commit(self) -> bool:
+        """ Add the written file to the cache, evicting least recently used files if needed. Return True on success. """
+
+        with self._lock:
+            if self._done:
+                return False
+
+            self._done = True
+            self._close_file()
+
+            if self.size == 0:
+                self.cache._abort(self.name)
+                return False
+
+            return self.cache._commit(self.name, self.size)
+
+    def abort(self) -> None:
+        """ Delete the written file. Does nothing once the fill is aborted or committed. """
+
+        with self._lock:
+            self._abort()
+
+    def _abort(self) -> None:
+        """ Must be called with the lock held. """
+
+        if self._done:
+            return
+
+        self._done = True
+        self._close_file()
+        self.cache._abort(self.name)
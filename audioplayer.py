@@ -1,22 +1,25 @@
 """ Audio player wrapper module for discord.py bot. """
 
-from settings import CAN_LOG, LOGGER, MAX_TRACK_HISTORY_LIMIT, OS_NAME, FFMPEG_EXEC
-from init.constants import MAX_STREAM_REFRESH_RETRY_COUNT
+from settings import CAN_LOG, LOGGER, MAX_TRACK_HISTORY_LIMIT, OS_NAME, PREFETCH_SECONDS
+from init.constants import MAX_STREAM_REFRESH_RETRY_COUNT, MAX_PREFETCHED_TRACK_AGE, PREBUFFER_FRAMES
 from bot import Bot, ShardedBot
 from init.logutils import log, log_to_discord_log
 from helpers.timehelpers import format_to_seconds
 from helpers.ffmpeghelpers import (
-    get_ffmpeg_options, check_stream, check_player_crash
+    create_audio_source, get_cached_audio, check_stream, check_player_crash
 )
-from helpers.guildhelpers import update_guild_state, update_guild_states
+from helpers.guildhelpers import update_guild_state, update_guild_states, get_playback_position
 from helpers.voicehelpers import set_voice_status, check_users_in_channel
-from helpers.queuehelpers import get_next_track
+from helpers.queuehelpers import get_next_track, peek_next_track
+from helpers.extractorhelpers import ExtractionPriority
+from webextractor import Track, canonicalize_url
+from audiosource import PrebufferedSource, PositionTrackingSource
 
 import asyncio
 import discord
 from discord.interactions import Interaction
 from enum import Enum
-from typing import Any, Literal
+from typing import Literal
 from datetime import datetime
 from time import monotonic
 from copy import deepcopy
@@ -71,32 +74,43 @@ class AudioPlayer:
             self, 
             interaction: Interaction,
             voice_client: discord.VoiceClient, 
-            track: dict[str, Any], 
+            track: Track, 
             position: int,
             is_looping: bool,
-            do_stream_check: bool=True
-        ) -> dict[str, Any] | None:
+            do_stream_check: bool=True,
+            source: discord.AudioSource | None=None
+        ) -> Track | None:
         """ Submit a track to the voice client player. 
+
+        `source` is an audio source already spawned for `track` at `position` (e.g. prebuffered), one is spawned if not given.
+        It is wrapped in a `PositionTrackingSource`, stored in the `audio_source` guild state.
+        Tracks in the audio cache are played from their local file without checking their stream.
         
         Return track on success or None if something went wrong while spawning an FFmpeg subprocess (not FFmpeg runtime error). """
 
         position = max(0, min(position, format_to_seconds(track["duration"])))
-        ffmpeg_options = get_ffmpeg_options(position, track["source_website"])
-
         try:
-            if do_stream_check:
-                track = await check_stream(interaction, self.client.client_http_session, track, MAX_STREAM_REFRESH_RETRY_COUNT)
+            if source is None:
+                if do_stream_check and get_cached_audio(track) is None:
+                    track = await check_stream(interaction, self.client.client_http_session, track, MAX_STREAM_REFRESH_RETRY_COUNT)
 
-            source = discord.FFmpegPCMAudio(track["url"], executable=FFMPEG_EXEC, options=ffmpeg_options["options"], before_options=ffmpeg_options["before_options"])
+                source = create_audio_source(track, position, self.client.stream_http_session)
+
+            source = PositionTrackingSource(source, position)
+            
             voice_client.stop()
             voice_client.play(source, after=lambda e: self.handle_playback_end(e, interaction))
+            update_guild_state(self.guild_states, interaction, source, "audio_source")
         except Exception as e:
+            if source is not None:
+                source.cleanup()
+
             self.handle_ffmpeg_spawn_error(interaction, e, is_looping)
             return None
         
         return track
 
-    async def update_player_states(self, interaction: Interaction, position: int, track: dict[str, Any], state: str | None) -> None:
+    async def update_player_states(self, interaction: Interaction, position: int, track: Track, state: str | None) -> None:
         """ Update player guild states after playing a track. """
         
         history = self.guild_states[interaction.guild.id]["queue_history"]
@@ -115,6 +129,7 @@ class AudioPlayer:
             update_guild_state(self.guild_states, interaction, track, "track_to_loop")
 
         update_guild_state(self.guild_states, interaction, track, "current_track")
+        self.schedule_prefetch(interaction, track)
 
         if not position > 0 and\
             not is_looping and\
@@ -130,6 +145,125 @@ class AudioPlayer:
             update_guild_state(self.guild_states, interaction, f"Listening to '{track['title']}'", "voice_status")
             await set_voice_status(self.guild_states, interaction)
 
+    def schedule_prefetch(self, interaction: Interaction, track: Track) -> None:
+        """ Cancel any running prefetch task, discard the previous prefetched track and start a new prefetch for the track after `track`. """
+
+        prefetch_task = self.guild_states[interaction.guild.id]["prefetch_task"]
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+
+        self.discard_prefetched_track(interaction)
+
+        if PREFETCH_SECONDS > 0:
+            update_guild_state(self.guild_states, interaction, asyncio.create_task(self.prefetch_next_track(interaction, track)), "prefetch_task")
+
+    async def prefetch_next_track(self, interaction: Interaction, track: Track) -> None:
+        """ Wait until `track` is `PREFETCH_SECONDS` away from its end, then validate or refresh the stream of the predicted next track
+        and spawn its prebuffered audio source (see `prebuffer_source()`).
+        
+        The resulting track is stored in the `prefetched_track` guild state along with the time it was validated at and its source (or None). """
+
+        track_duration = format_to_seconds(track["duration"]) or 0
+
+        while True:
+            state = self.guild_states.get(interaction.guild.id)
+            if state is None or state["current_track"] is not track:
+                return
+            
+            is_playing = state["voice_client"].is_playing()
+            elapsed_time = get_playback_position(self.guild_states, interaction)
+            time_until_prefetch = track_duration - elapsed_time - PREFETCH_SECONDS
+
+            if time_until_prefetch <= 0 and is_playing:
+                break
+
+            await asyncio.sleep(max(1, time_until_prefetch))
+
+        next_track = peek_next_track(state["is_random"], state["is_looping"], state["track_to_loop"], state["filters"], state["queue"], state["queue_to_loop"])
+        if next_track is None:
+            return
+        
+        try:
+            if get_cached_audio(next_track) is not None:
+                prefetched_track = next_track # Played from the audio cache, no stream to validate
+            else:
+                prefetched_track = await check_stream(interaction, self.client.client_http_session, next_track, MAX_STREAM_REFRESH_RETRY_COUNT, ExtractionPriority.BACKGROUND)
+        except Exception as e:
+            log(f"[GUILDSTATE][SHARD ID {interaction.guild.shard_id}] Failed to prefetch next track in guild ID {interaction.guild.id}. It will be checked again before playback.")
+            log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+            return
+        
+        validated_at = monotonic()
+        source = await self.prebuffer_source(interaction, prefetched_track)
+
+        self.discard_prefetched_track(interaction)
+        update_guild_state(self.guild_states, interaction, (prefetched_track, validated_at, source), "prefetched_track")
+
+    async def prebuffer_source(self, interaction: Interaction, track: Track) -> PrebufferedSource | None:
+        """ Spawn the audio source of `track` and read its first `PREBUFFER_FRAMES` frames ahead, so it can start playing instantly.
+        
+        Return None if the source could not be spawned or output nothing. The source is cleaned up if the caller is cancelled. """
+
+        try:
+            source = PrebufferedSource(create_audio_source(track, 0, self.client.stream_http_session))
+        except Exception as e:
+            log(f"[GUILDSTATE][SHARD ID {interaction.guild.shard_id}] Failed to spawn the next track's audio source in guild ID {interaction.guild.id}. It will be spawned before playback.")
+            log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+            return None
+        
+        try:
+            buffered = await asyncio.to_thread(source.prebuffer, PREBUFFER_FRAMES)
+        except BaseException as e:
+            source.cleanup()
+
+            if not isinstance(e, Exception):
+                raise
+            
+            log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+            return None
+        
+        if buffered == 0: # FFmpeg failed to read the stream, let playback spawn a new one
+            source.cleanup()
+            return None
+        
+        return source
+
+    def discard_prefetched_track(self, interaction: Interaction) -> None:
+        """ Clear the `prefetched_track` guild state and clean up its unused audio source, if any. """
+
+        prefetched = self.guild_states[interaction.guild.id]["prefetched_track"]
+        update_guild_state(self.guild_states, interaction, None, "prefetched_track")
+
+        if prefetched is not None and prefetched[2] is not None:
+            prefetched[2].cleanup()
+
+    def pop_prefetched_track(self, interaction: Interaction, track: Track) -> tuple[Track, PrebufferedSource | None] | None:
+        """ Return the prefetched version of `track` and its prebuffered audio source (or None) if it was validated recently, 
+        and clear the `prefetched_track` guild state. 
+        
+        An unused prebuffered source is cleaned up. """
+
+        prefetched = self.guild_states[interaction.guild.id]["prefetched_track"]
+        update_guild_state(self.guild_states, interaction, None, "prefetched_track")
+
+        if prefetched is None:
+            return None
+        
+        prefetched_track, validated_at, source = prefetched
+
+        if canonicalize_url(prefetched_track["webpage_url"]) != canonicalize_url(track["webpage_url"]) or\
+            monotonic() - validated_at > MAX_PREFETCHED_TRACK_AGE:
+            if source is not None:
+                source.cleanup()
+
+            return None
+
+        # Keep the user-facing data of the picked track, like check_stream() does.
+        prefetched_track["title"] = track["title"]
+        prefetched_track["source_website"] = track["source_website"]
+
+        return prefetched_track, source
+
     async def check_player_stop_flags(self, interaction: Interaction) -> PlayerStopReasonValue | None:
         """ Check some protection flags (`stop_flag`, `voice_client_locked`) and run some voice client checks.
          
@@ -159,13 +293,19 @@ class AudioPlayer:
             self, 
             interaction: Interaction, 
             voice_client: discord.VoiceClient, 
-            track: dict[str, Any], 
+            track: Track, 
             position: int=0, 
-            state: str | None=None
+            state: str | None=None,
+            is_stream_checked: bool=False,
+            source: discord.AudioSource | None=None
         ) -> bool:
         """ Play a track on an available voice client. 
         
         A track must be a dict containing a `url` key that points to a valid stream readable by ffmpeg and track metadata such as `title`, `duration`, etc.. 
+
+        `is_stream_checked` skips the stream check, for tracks validated beforehand. 
+        
+        `source` is an audio source already spawned for `track` at `position`, used instead of spawning a new one.
         
         This function does _NOT_ lock the voice client before submitting the track to the player.
 
@@ -178,7 +318,7 @@ class AudioPlayer:
 
         is_looping = self.guild_states[interaction.guild.id]["is_looping"]
 
-        updated_track = await self.submit_track_to_player(interaction, voice_client, track, position, is_looping, state != "retry") # Crash handler already ensures stream is fine
+        updated_track = await self.submit_track_to_player(interaction, voice_client, track, position, is_looping, state != "retry" and not is_stream_checked, source) # Crash handler already ensures stream is fine
         if updated_track is not None:
             await self.update_player_states(interaction, position, updated_track, state)
             return True
@@ -217,7 +357,7 @@ class AudioPlayer:
         if not queue and not\
             is_looping and not\
             queue_to_loop:
-            update_guild_states(self.guild_states, interaction, (None, 0, 0, False), ("current_track", "start_time", "elapsed_time", "voice_client_locked"))
+            update_guild_states(self.guild_states, interaction, (None, None, 0, 0, False), ("current_track", "audio_source", "start_time", "elapsed_time", "voice_client_locked"))
             
             if can_update_status:
                 update_guild_state(self.guild_states, interaction, None, "voice_status")
@@ -233,9 +373,16 @@ class AudioPlayer:
             queue = self.guild_states[interaction.guild.id]["queue"]
 
         track = get_next_track(is_random, is_looping, track_to_loop, filters, queue)
+        prefetched_track, prefetched_source = self.pop_prefetched_track(interaction, track) or (None, None)
 
         try:
-            play_success = await self.play_track(interaction, voice_client, track)
+            play_success = await self.play_track(
+                interaction, 
+                voice_client, 
+                prefetched_track or track, 
+                is_stream_checked=prefetched_track is not None, 
+                source=prefetched_source
+            )
         finally:
             update_guild_states(self.guild_states, interaction, (False, 0, 0), ("voice_client_locked", "crash_recovery_count", "last_recovery_time"))
 
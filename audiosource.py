@@ -0,0 +1,131 @@
+""" Audio source module for discord.py bot.
+
+Audio source wrappers used by the audio player. """
+
+from streambuffer import StreamBuffer
+
+import discord
+from discord.opus import Encoder
+from collections import deque
+
+# Duration in milliseconds of an Opus frame, indexed by the TOC byte's configuration number (RFC 6716, section 3.1).
+_OPUS_FRAME_DURATIONS_MS = (
+    (10, 20, 40, 60) * 3 + # SILK-only
+    (10, 20) * 2 + # Hybrid
+    (2.5, 5, 10, 20) * 4 # CELT-only
+)
+_PCM_BYTES_PER_SECOND = Encoder.SAMPLING_RATE * Encoder.CHANNELS * 2 # 16-bit samples
+
+def get_opus_packet_duration(packet: bytes) -> float:
+    """ Return the duration of an Opus packet in seconds, read from its TOC byte. """
+
+    toc = packet[0]
+    frame_count_code = toc & 0x3
+
+    if frame_count_code == 0:
+        frame_count = 1
+    elif frame_count_code in (1, 2):
+        frame_count = 2
+    else:
+        frame_count = packet[1] & 0x3F if len(packet) > 1 else 1
+
+    return _OPUS_FRAME_DURATIONS_MS[toc >> 3] * frame_count / 1000
+
+class PrebufferedSource(discord.AudioSource):
+    """ Audio source wrapper able to read the first frames of its source ahead of playback.
+
+    Used to spawn and fill the next track's FFmpeg process while the current track is still playing,
+    so the next track starts without waiting for FFmpeg to connect and output its first frames.
+
+    `source`: The wrapped audio source. It is cleaned up along with this object. """
+
+    def __init__(self, source: discord.AudioSource):
+        self.source = source
+        self._buffer = deque()
+
+    def prebuffer(self, frames: int) -> int:
+        """ Read up to `frames` frames (20ms each) ahead. Stops early if the source ends.
+
+        Blocks until the frames are read and must be sent to a thread if working with an asyncio loop.
+        Must not be called once playback has started.
+
+        Return the amount of buffered frames. """
+
+        while len(self._buffer) < frames:
+            frame = self.source.read()
+            if not frame:
+                break
+
+            self._buffer.append(frame)
+
+        return len(self._buffer)
+
+    def read(self) -> bytes:
+        if self._buffer:
+            return self._buffer.popleft()
+
+        return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        self._buffer.clear()
+        self.source.cleanup()
+
+class PositionTrackingSource(discord.AudioSource):
+    """ Audio source wrapper counting the audio actually delivered to the voice client, for an exact playback position.
+
+    Opus packets are measured from their TOC byte and PCM frames from their size, so pauses,
+    slow streams and FFmpeg stalls never skew the position.
+
+    `source`: The wrapped audio source. It is cleaned up along with this object.
+
+    `start_position`: Position of the first frame of `source` in the track, in seconds (e.g. the seek position). """
+
+    def __init__(self, source: discord.AudioSource, start_position: float=0):
+        self.source = source
+        self.start_position = start_position
+        self.is_source_opus = source.is_opus()
+        self._played = 0.0
+
+    @property
+    def position(self) -> float:
+        """ Position of the last delivered frame in the track, in seconds. """
+
+        return self.start_position + self._played
+
+    def read(self) -> bytes:
+        frame = self.source.read()
+
+        if frame:
+            self._played += get_opus_packet_duration(frame) if self.is_source_opus else len(frame) / _PCM_BYTES_PER_SECOND
+
+        return frame
+
+    def is_opus(self) -> bool:
+        return self.is_source_opus
+
+    def cleanup(self) -> None:
+        self.source.cleanup()
+
+class StreamBufferedSource(discord.AudioSource):
+    """ Audio source wrapper owning the `StreamBuffer` its source reads its input from.
+
+    `source`: The wrapped audio source. It is cleaned up along with this object.
+
+    `stream_buffer`: The stream buffer feeding `source`. It is closed when this object is cleaned up. """
+
+    def __init__(self, source: discord.AudioSource, stream_buffer: StreamBuffer):
+        self.source = source
+        self.stream_buffer = stream_buffer
+
+    def read(self) -> bytes:
+        return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        self.stream_buffer.close() # Unblocks FFmpeg's stdin writer thread
+        self.source.cleanup()
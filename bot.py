@@ -4,18 +4,21 @@ from settings import (
     ACTIVITY_DATA, ACTIVITY, STATUS,
     ROLE_LOCKS, PLAYLIST_LOCKS, 
     LOGGER, CAN_LOG, CONFIG,
-    YDL
+    YDL_POOL, EXTRACTOR_PROCESS_POOL, METADATA_CACHE, AUDIO_CACHE, CACHE_WARM_UP_TRACK_COUNT, STREAM_BUFFER_SIZE
 )
-from init.constants import MAX_IO_SYNC_WAIT_TIME, HTTP_CLIENT_SESSION_TIMEOUT
+from init.constants import MAX_IO_SYNC_WAIT_TIME, HTTP_CLIENT_SESSION_TIMEOUT, MAX_STREAM_BUFFER_CONNECTIONS
 from loader import ModuleLoader
 from helpers.lockhelpers import set_global_locks, get_file_lock, get_vc_lock
+from helpers.extractorhelpers import EXTRACTOR_SCHEDULER, warm_up_extractor_cache
 from init.logutils import log, separator, log_to_discord_log
 from guildchecks import ensure_guild_data, check_guild_data
 
 import asyncio
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from discord.ext import commands
 from discord.app_commands import AppCommand
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
 from time import monotonic
 from random import randint
 
@@ -29,6 +32,8 @@ class BotMixin:
         self.has_finished_on_ready = False
         self.is_sharded = False
         self.client_http_session = None
+        self.stream_http_session = None
+        self.cache_warm_up_task = None
 
         self.loaded_cogs = []
         self.synced_commands = []
@@ -40,6 +45,9 @@ class BotMixin:
         log("Running setup_hook()")
         separator()
 
+        # Every running extraction uses a thread, on top of the threads asyncio.to_thread() normally has for disk I/O
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(EXTRACTOR_SCHEDULER.slots + min(32, (cpu_count() or 1) + 4)))
+
         await self.setup_client_session()
 
     async def on_ready(self) -> None:
@@ -90,6 +98,9 @@ class BotMixin:
         
         await self.wait_for_read_write_sync()
 
+        if self.cache_warm_up_task is not None:
+            self.cache_warm_up_task.cancel()
+
         await super().close()
 
         await self.close_sessions()
@@ -198,23 +209,51 @@ class BotMixin:
         return self.synced_commands
 
     async def setup_client_session(self) -> None:
-        """ Set up an aiohttp ClientSession """
+        """ Set up an aiohttp ClientSession, and a separate one for buffered streams if stream buffering or the audio cache is enabled.
+        
+        Buffered streams hold a connection for a whole track, so they get their own connection pool and never make other requests wait. """
 
         self.client_http_session = ClientSession(timeout=ClientTimeout(HTTP_CLIENT_SESSION_TIMEOUT))
         log(f"Set up a generic aiohttp ClientSession with {HTTP_CLIENT_SESSION_TIMEOUT}s request timeout.")
+
+        if STREAM_BUFFER_SIZE > 0 or AUDIO_CACHE is not None:
+            self.stream_http_session = ClientSession(connector=TCPConnector(limit=MAX_STREAM_BUFFER_CONNECTIONS))
+            log(f"Set up an aiohttp ClientSession for buffered streams with up to {MAX_STREAM_BUFFER_CONNECTIONS} connections.")
+        
         separator()
 
     async def close_sessions(self) -> None:
-        """ Close any active sessions, such as yt_dlp.YoutubeDL() and aiohttp.ClientSession(). """
+        """ Close any active sessions, such as the yt_dlp.YoutubeDL() pool, aiohttp.ClientSession(), extractor worker processes, the metadata cache and the audio cache. """
         
         if self.client_http_session is not None and\
             not self.client_http_session.closed:
             await self.client_http_session.close()
 
             log("Closed aiohttp ClientSession")
+
+        if self.stream_http_session is not None and\
+            not self.stream_http_session.closed:
+            await self.stream_http_session.close()
+
+            log("Closed buffered stream aiohttp ClientSession")
         
-        YDL.close()
-        log("Closed yt_dlp YoutubeDL session")
+        YDL_POOL.close()
+        log("Closed yt_dlp YoutubeDL pool")
+
+        if EXTRACTOR_PROCESS_POOL is not None:
+            await asyncio.to_thread(EXTRACTOR_PROCESS_POOL.close)
+
+            log("Shut down extractor worker processes")
+
+        if METADATA_CACHE is not None:
+            METADATA_CACHE.close()
+
+            log("Closed metadata cache database")
+
+        if AUDIO_CACHE is not None:
+            await asyncio.to_thread(AUDIO_CACHE.close)
+
+            log("Saved audio cache usage order")
 
     async def handle_filesystem_tasks(self) -> bool:
         """ Handle filesystem tasks such as checking the `guild_data` directory and unused data """
@@ -263,6 +302,31 @@ class BotMixin:
 
         await asyncio.sleep(0.3)
 
+        self.start_cache_warm_up()
+
+    def start_cache_warm_up(self) -> None:
+        """ Start warming up the extractor cache with the most saved tracks in the background, if enabled. """
+
+        if CACHE_WARM_UP_TRACK_COUNT <= 0 or self.cache_warm_up_task is not None:
+            return
+        
+        log(f"Warming up extractor cache with up to {CACHE_WARM_UP_TRACK_COUNT} saved tracks in the background.")
+        separator()
+
+        self.cache_warm_up_task = asyncio.create_task(self.warm_up_cache())
+
+    async def warm_up_cache(self) -> None:
+        """ Background task warming up the extractor cache. Errors are logged and end the warm-up. """
+
+        try:
+            extracted = await warm_up_extractor_cache(CACHE_WARM_UP_TRACK_COUNT, self.client_http_session)
+        except Exception as e:
+            log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+            log(f"An error occurred while warming up the extractor cache\nErr: {e}")
+            return
+        
+        log(f"Extractor cache warm-up done, extracted {extracted} tracks.")
+
     async def wait_for_read_write_sync(self) -> None:
         """ Wait for any write/reads to finish before closing to keep data safe. """
 
@@ -0,0 +1,102 @@
+""" Extractor metrics module for discord.py bot.
+
+Collects extraction latency, wait times, cache outcomes, playlist sizes and errors per source website.
+Metrics are sent to a sink, which decides where they go. `MetricsSink` discards them and `InMemoryMetricsSink` keeps a summary in memory.
+Other backends (e.g. Prometheus, StatsD) can subclass `MetricsSink`. """
+
+from bisect import bisect_left
+from threading import Lock
+from typing import Any
+
+# Upper bounds of histogram buckets, per metric name. The last bucket holds everything above.
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+ENTRIES_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500)
+HISTOGRAM_BUCKETS = {
+    "extraction_seconds": SECONDS_BUCKETS,
+    "native_extraction_seconds": SECONDS_BUCKETS,
+    "search_seconds": SECONDS_BUCKETS,
+    "slot_wait_seconds": SECONDS_BUCKETS,
+    "playlist_entries": ENTRIES_BUCKETS
+}
+
+class MetricsSink:
+    """ Base metrics sink. Discards every metric.
+
+    Every method may be called from any thread and must never raise. """
+
+    def increment(self, name: str, source: str, amount: int=1) -> None:
+        """ Add `amount` to counter `name` of source website `source`. """
+
+    def observe(self, name: str, source: str, value: float) -> None:
+        """ Record `value` in histogram `name` of source website `source`. """
+
+    def get_summary(self) -> dict[str, dict[str, Any]] | None:
+        """ Return a summary of recorded metrics, or None if this sink can't summarize them. """
+
+        return None
+
+class InMemoryMetricsSink(MetricsSink):
+    """ Thread-safe metrics sink keeping counters and bucketed histograms in memory since startup. """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name: str, source: str, amount: int=1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[source] = counters.get(source, 0) + amount
+
+    def observe(self, name: str, source: str, value: float) -> None:
+        buckets = HISTOGRAM_BUCKETS.get(name, SECONDS_BUCKETS)
+
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(source)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(buckets) + 1)}
+                self._histograms[name][source] = histogram
+
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["buckets"][bisect_left(buckets, value)] += 1
+
+    def get_summary(self) -> dict[str, dict[str, Any]]:
+        """ Return every counter and histogram, per metric name and source website.
+
+        Histograms are summarized as their count, average, maximum and estimated 50th/95th percentile (bucket upper bounds). """
+
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {name: {source: dict(histogram, buckets=list(histogram["buckets"])) for source, histogram in values.items()} for name, values in self._histograms.items()}
+
+        summary = {"counters": counters, "histograms": {}}
+
+        for name, values in histograms.items():
+            buckets = HISTOGRAM_BUCKETS.get(name, SECONDS_BUCKETS)
+            summary["histograms"][name] = {
+                source: {
+                    "count": histogram["count"],
+                    "average": histogram["sum"] / histogram["count"],
+                    "max": histogram["max"],
+                    "p50": get_percentile(histogram["buckets"], buckets, histogram["max"], 0.5),
+                    "p95": get_percentile(histogram["buckets"], buckets, histogram["max"], 0.95)
+                } for source, histogram in values.items()
+            }
+
+        return summary
+
+def get_percentile(counts: list[int], buckets: tuple[float, ...], maximum: float, percentile: float) -> float:
+    """ Estimate a percentile of a bucketed histogram as the upper bound of the bucket it falls in, capped at `maximum`. """
+
+    total = sum(counts)
+    target = total * percentile
+    seen = 0
+
+    for i, count in enumerate(counts):
+        seen += count
+        if seen >= target and count:
+            return min(buckets[i], maximum) if i < len(buckets) else maximum
+
+    return maximum
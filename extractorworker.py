@@ -0,0 +1,250 @@
+""" Extractor worker module for discord.py bot.
+
+Runs yt-dlp extractions inside worker processes when the `process` extractor backend is enabled.
+Each worker runs one extraction at a time and is killed if its extraction gets aborted, so a stuck extraction never holds on to a worker.
+
+This module must not import any other project module, as it gets imported by every worker process. """
+
+from ydlpool import YoutubeDLPool
+
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from queue import Queue, Empty
+from threading import Event, Lock
+from typing import Any
+
+_POLL_INTERVAL_SECONDS = 0.25
+_KILL_JOIN_TIMEOUT_SECONDS = 2
+
+# Keys kept from a yt-dlp info hashmap when sending it back to the main process.
+TRACK_INFO_KEYS = (
+    "_type",
+    "title",
+    "uploader",
+    "channel",
+    "duration",
+    "upload_date",
+    "timestamp",
+    "webpage_url",
+    "url",
+    "thumbnail",
+    "http_headers",
+    "acodec",
+    "protocol"
+)
+
+# Single-instance YoutubeDL pool owned by the current worker process. Created by init_worker().
+_YDL_POOL = None
+
+def init_worker(ydl_options: dict[str, Any], max_uses: int) -> None:
+    """ Process pool initializer. Create the YoutubeDL pool used by this worker. """
+
+    global _YDL_POOL
+    _YDL_POOL = YoutubeDLPool(ydl_options, 1, max_uses)
+
+def compact_info(info: dict[str, Any]) -> dict[str, Any]:
+    """ Return a copy of `info` holding only the keys in `TRACK_INFO_KEYS`.
+
+    Playlist and search `entries` are compacted as well. """
+
+    compact = {key: info[key] for key in TRACK_INFO_KEYS if key in info}
+
+    # Flat playlist entries only carry a list of thumbnails, keep the last (largest) one.
+    if "thumbnail" not in compact and info.get("thumbnails"):
+        compact["thumbnail"] = info["thumbnails"][-1].get("url")
+
+    if "entries" in info:
+        compact["entries"] = [compact_info(entry) if entry is not None else None for entry in info["entries"]]
+
+    return compact
+
+def extract(url: str, params: dict[str, Any] | None=None, process: bool=True) -> dict[str, Any] | None:
+    """ Extract `url` with this worker's YoutubeDL pool and return a compact info hashmap.
+
+    `params` are extra YoutubeDL options applied to this extraction only. `process` is passed to `YoutubeDL.extract_info()`.
+
+    Exceptions are re-raised as RuntimeError, since yt-dlp exceptions are not guaranteed to be picklable. """
+
+    try:
+        with _YDL_POOL.checkout(params) as ydl:
+            info = ydl.extract_info(url, download=False, process=process)
+    except Exception as e:
+        raise RuntimeError(f"{e.__class__.__name__}: {e}") from None
+
+    return compact_info(info) if info is not None else None
+
+def run_worker(connection: Connection, ydl_options: dict[str, Any], max_uses: int) -> None:
+    """ Worker process entry point. Extract every `(url, params, process)` request received on `connection` and send back
+    a `(True, info)` or `(False, error message)` tuple. A None request stops the worker. """
+
+    init_worker(ydl_options, max_uses)
+
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            break
+
+        if request is None:
+            break
+
+        url, params, process = request
+
+        try:
+            response = (True, extract(url, params, process))
+        except Exception as e:
+            response = (False, str(e))
+
+        try:
+            connection.send(response)
+        except (EOFError, OSError):
+            break
+
+class ExtractorProcessPool:
+    """ Pool of extractor worker processes that can abort in-flight extractions.
+
+    `size`: Maximum amount of worker processes alive at the same time. Workers are spawned on demand.
+
+    `ydl_options` and `max_uses` are passed to every worker's YoutubeDL pool.
+
+    Unlike a `concurrent.futures.ProcessPoolExecutor`, every worker has its own pipe, so a single extraction can be
+    aborted by killing its worker. A replacement is spawned on the next extraction. """
+
+    def __init__(self, size: int, ydl_options: dict[str, Any], max_uses: int):
+        self.size = max(1, size)
+        self.ydl_options = ydl_options
+        self.max_uses = max_uses
+
+        # Workers must not be forked from this multithreaded process, locks held by other threads would stay locked in the child.
+        # The fork server only preloads this module, not the main script (see main.py).
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+        if self._context.get_start_method() == "forkserver":
+            self._context.set_forkserver_preload([__name__])
+        self._idle = Queue()
+        self._lock = Lock()
+        self._created = 0
+        self._closed = False
+
+    def _spawn(self) -> tuple[BaseProcess, Connection]:
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=run_worker, args=(worker_connection, self.ydl_options, self.max_uses), daemon=True)
+        process.start()
+        worker_connection.close()
+
+        return process, connection
+
+    def _acquire(self, abort: Event | None) -> tuple[BaseProcess, Connection]:
+        """ Return an idle worker, spawn a new one if the pool is not full or wait for one to be released. """
+
+        while True:
+            if abort is not None and abort.is_set():
+                raise InterruptedError("Extraction aborted.")
+            
+            try:
+                worker = self._idle.get_nowait()
+            except Empty:
+                worker = None
+
+            if worker is not None:
+                if worker[0].is_alive():
+                    return worker
+                
+                self._kill(worker) # Died while idle
+                continue
+
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Extractor process pool is closed.")
+
+                can_spawn = self._created < self.size
+                if can_spawn:
+                    self._created += 1
+
+            if can_spawn:
+                try:
+                    return self._spawn()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            try:
+                worker = self._idle.get(timeout=_POLL_INTERVAL_SECONDS)
+            except Empty:
+                continue
+
+            self._idle.put(worker) # Let the next iteration check it
+
+    def _release(self, worker: tuple[BaseProcess, Connection]) -> None:
+        with self._lock:
+            closed = self._closed
+
+        if closed:
+            self._kill(worker)
+            return
+
+        self._idle.put(worker)
+
+    def _kill(self, worker: tuple[BaseProcess, Connection]) -> None:
+        process, connection = worker
+
+        if process.is_alive():
+            process.kill()
+        
+        process.join(_KILL_JOIN_TIMEOUT_SECONDS)
+        connection.close()
+
+        with self._lock:
+            self._created -= 1
+
+    def run(self, url: str, params: dict[str, Any] | None=None, abort: Event | None=None, process: bool=True) -> dict[str, Any] | None:
+        """ Extract `url` in a worker process and return its compact info hashmap. Blocks until the extraction is done.
+
+        If `process` is False, the info is returned as given by the site's extractor, without resolving formats (see `YoutubeDL.extract_info()`).
+
+        Setting `abort` kills the worker and raises InterruptedError within a fraction of a second.
+        Extraction errors are raised as RuntimeError. """
+
+        worker = self._acquire(abort)
+        process, connection = worker
+
+        try:
+            connection.send((url, params, process))
+
+            while not connection.poll(_POLL_INTERVAL_SECONDS):
+                if abort is not None and abort.is_set():
+                    raise InterruptedError("Extraction aborted.")
+                elif not process.is_alive():
+                    raise RuntimeError("Extractor worker process died.")
+
+            success, payload = connection.recv()
+        except BaseException:
+            self._kill(worker)
+            raise
+
+        self._release(worker)
+
+        if not success:
+            raise RuntimeError(payload)
+
+        return payload
+
+    def close(self) -> None:
+        """ Stop every idle worker. Busy workers are killed when released. """
+
+        with self._lock:
+            self._closed = True
+
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except Empty:
+                break
+
+            try:
+                worker[1].send(None)
+            except (EOFError, OSError):
+                pass
+
+            self._kill(worker)
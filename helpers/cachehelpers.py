@@ -1,5 +1,7 @@
 """ Cache helpers for discord.py bot. """
 
+from init.constants import DEFAULT_EXTRACTOR_CACHE_TTL, MAX_EXTRACTOR_CACHE_TTL, STREAM_URL_EXPIRY_MARGIN, NEGATIVE_EXTRACTOR_CACHE_TTLS
+
 from typing import Any, Hashable
 
 # Caching tools
@@ -13,4 +15,32 @@ def get_cache(cache: dict, identifier: Hashable) -> Any | None:
     return cache.get(identifier)
     
 def invalidate_cache(identifier: Hashable, cache: dict) -> None:
-    cache.pop(identifier, None)
\ No newline at end of file
+    cache.pop(identifier, None)
+
+def get_extractor_cache_ttu(_key: Hashable, value: dict[str, Any] | list[dict[str, Any]], now: float) -> float:
+    """ `ttu` function for the extractor TLRUCache. Timer must be `time.time`.
+
+    Return the time an extracted track (or list of tracks) expires at, based on the earliest `stream_expires_at` value minus a safety margin.
+    Tracks without a known expiry use the default TTL. """
+
+    tracks = value if isinstance(value, list) else [value]
+    expires_at = now + MAX_EXTRACTOR_CACHE_TTL
+
+    for track in tracks:
+        stream_expires_at = track.get("stream_expires_at")
+
+        if stream_expires_at is None:
+            expires_at = min(expires_at, now + DEFAULT_EXTRACTOR_CACHE_TTL)
+        else:
+            expires_at = min(expires_at, stream_expires_at - STREAM_URL_EXPIRY_MARGIN)
+
+    return expires_at
+
+def get_negative_extractor_cache_ttu(_key: Hashable, value: tuple[str, Any], now: float) -> float:
+    """ `ttu` function for the negative extractor TLRUCache. Timer must be `time.time`.
+
+    `value` is a `(reason, error)` tuple, the entry lives for the TTL of its failure reason. Unknown reasons use the `transient` TTL. """
+
+    reason = value[0]
+
+    return now + NEGATIVE_EXTRACTOR_CACHE_TTLS.get(reason, NEGATIVE_EXTRACTOR_CACHE_TTLS["transient"])
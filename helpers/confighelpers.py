@@ -52,7 +52,7 @@ def get_default_yt_dlp_config_data() -> dict[str, dict[str, Any]]:
         ConfigCategory.YT_DLP.value: {
             "quiet": True,
             "noplaylist": True,
-            "format": "bestaudio[ext=m4a]/bestaudio",
+            "format": "bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio",
             "no_warnings": True,
             "getcomments": False,
             "writeautomaticsub": False,
@@ -70,7 +70,22 @@ def get_other_default_config_data() -> dict[str, dict[str, Any]]:
             "log_level": "normal",
             "use_sharding": False,
             "auto_delete_unused_guild_data": True,
-            "ffmpeg_bin": None
+            "ffmpeg_bin": None,
+            "extractor_backend": "thread",
+            "playback_mode": "opus",
+            "extractor_process_count": 4,
+            "yt_dlp_pool_size": 16,
+            "yt_dlp_pool_max_uses": 500,
+            "enable_metadata_cache": True,
+            "metadata_cache_ttl": 604800,
+            "lazy_playlist_extraction": True,
+            "prefetch_seconds": 10,
+            "extraction_timeout": 120,
+            "enable_native_extractors": True,
+            "cache_warm_up_track_count": 0,
+            "enable_extractor_metrics": True,
+            "stream_buffer_size_kb": 0,
+            "audio_cache_size_mb": 0
         }
     }
 
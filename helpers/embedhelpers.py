@@ -1,6 +1,6 @@
 """ Embed helpers module for discord.py bot. """
 
-from webextractor import SourceWebsiteValue
+from webextractor import SourceWebsiteValue, Track
 
 import discord
 from datetime import datetime
@@ -156,10 +156,10 @@ def generate_playlists_embed(names: list[str], remaining: int, page: int, total_
     return embed
 
 def generate_current_track_embed(
-        info: dict[str, Any],
-        queue: list | list[dict[str, Any]],
-        queue_to_loop: list | list[dict[str, Any]],
-        track_to_loop: dict[str, Any] | None,
+        info: Track,
+        queue: list | list[Track],
+        queue_to_loop: list | list[Track],
+        track_to_loop: Track | None,
         elapsed_time: int,
         looping: bool,
         random: bool,
@@ -198,7 +198,7 @@ def generate_current_track_embed(
 
     return embed
 
-def generate_generic_track_embed(info: dict[str, Any], embed_title: str="Track info") -> discord.Embed:
+def generate_generic_track_embed(info: Track | dict[str, Any], embed_title: str="Track info") -> discord.Embed:
     """ Generate an embed to show some info about an `info` track object. """
     
     embed = _get_embed(embed_title)
@@ -257,4 +257,64 @@ def generate_ping_embed(websocket: float, response: float) -> discord.Embed:
     embed.add_field(name="Websocket latency", value=f"[ `{websocket}ms` ]", inline=True)
     embed.add_field(name="Response latency", value=f"[ `{response}ms` ]", inline=True)
 
-    return embed
\ No newline at end of file
+    return embed
+
+def generate_extractor_stats_embed(summary: dict[str, dict[str, Any]], wait_stats: dict[str, dict[str, float | int]]) -> discord.Embed:
+    """ Generate an embed summarizing extractor metrics per source website (see `InMemoryMetricsSink.get_summary()`) 
+    and the extractor scheduler's wait stats per priority class. """
+
+    embed = _get_embed("Extractor stats", discord.Colour.blurple())
+    counters = summary["counters"]
+    histograms = summary["histograms"]
+
+    sources = sorted({source for values in (*counters.values(), *histograms.values()) for source in values})
+    fields = []
+
+    for source in sources:
+        lines = []
+
+        for name, label in (("extraction_seconds", "Extraction"), ("native_extraction_seconds", "Native"), ("search_seconds", "Search"), ("slot_wait_seconds", "Slot wait")):
+            histogram = histograms.get(name, {}).get(source)
+            if histogram is not None:
+                lines.append(f"{label}: `{histogram['count']}` | avg `{histogram['average']:.2f}s` | p95 `{histogram['p95']:.2f}s` | max `{histogram['max']:.2f}s`")
+
+        hits = counters.get("cache_hits", {}).get(source, 0)
+        misses = counters.get("cache_misses", {}).get(source, 0)
+        if hits or misses:
+            lines.append(f"Cache: `{hits}` hits | `{misses}` misses ({hits / (hits + misses):.0%} hit rate)")
+
+        other_hits = [
+            f"`{counters[name][source]}` {label}" for name, label in (
+                ("negative_cache_hits", "negative"), 
+                ("metadata_cache_hits", "metadata"), 
+                ("search_cache_hits", "search"), 
+                ("native_fallbacks", "native fallbacks")
+            ) if source in counters.get(name, {})
+        ]
+        if other_hits:
+            lines.append("Other: " + " | ".join(other_hits))
+
+        entries = histograms.get("playlist_entries", {}).get(source)
+        if entries is not None:
+            lines.append(f"Playlists: `{entries['count']}` | avg `{entries['average']:.1f}` entries | max `{entries['max']:.0f}`")
+
+        errors = [f"`{values[source]}` {name.split('.', 1)[1]}" for name, values in sorted(counters.items()) if name.startswith(("errors.", "exceptions.")) and source in values]
+        if errors:
+            lines.append("Errors: " + " | ".join(errors))
+
+        value = "\n".join(lines)[:550] or "No data." # Keep the whole embed under 6000 characters
+        fields.append({"name": source, "value": value, "inline": False})
+
+    slots = wait_stats.get("slots", {})
+    scheduler_lines = [f"Slots: `{slots.get('active', 0)}/{slots.get('total', 0)}` in use"]
+    for priority, stats in wait_stats.items():
+        if priority == "slots":
+            continue
+
+        scheduler_lines.append(f"{priority}: `{stats['count']}` | avg wait `{stats['average_wait']:.2f}s` | max `{stats['max_wait']:.2f}s` | `{stats['waiting']}` waiting")
+
+    fields.insert(0, {"name": "Scheduler", "value": "\n".join(scheduler_lines), "inline": False})
+
+    _add_up_to_24(embed, fields)
+
+    return embed
@@ -1,15 +1,336 @@
 """ Extractor helper functions for discord.py bot """
 
-from settings import EXTRACTOR_SEMAPHORE
-from helpers.guildhelpers import update_query_extraction_state, update_guild_state
-from webextractor import SourceWebsiteValue, SearchWebsiteIDValue, fetch, get_query_type
+from settings import (
+    EXTRACTOR_IN_FLIGHT, EXTRACTION_TIMEOUT, MAX_ITEM_NAME_LENGTH, EXTRACTOR_METRICS, 
+    EXTRACTOR_PROCESS_POOL, EXTRACTOR_PROCESS_COUNT, YDL_POOL_SIZE
+)
+from init.constants import MAX_CONCURRENT_QUERY_EXTRACTIONS, EXTRACTOR_WAIT_LOG_THRESHOLD_SECONDS, CACHE_WARM_UP_INTERVAL_SECONDS
+from init.logutils import log
+from helpers.guildhelpers import update_query_extraction_state, update_guild_state, read_all_guild_json
+from helpers.playlisthelpers import rank_saved_tracks
+from webextractor import (
+    SourceWebsiteValue, SearchWebsiteIDValue, QueryType, Track, PLAYLIST_WEBSITES, 
+    fetch, fetch_metadata, fetch_native, has_native_extractor, get_playlist_track, iter_playlist, 
+    get_query_type, get_cache_key, get_cached_failure, get_cached_tracks, store_failure, canonicalize_url
+)
 from error import Error
 
 import asyncio
+from asyncio import TimeoutError
+from aiohttp import ClientSession
 from discord.interactions import Interaction
-from typing import Any
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+from copy import deepcopy
+from contextlib import aclosing, asynccontextmanager
+from collections import OrderedDict, deque
+from enum import Enum
+from time import monotonic
+from threading import Event
+
+class ExtractionPriority(Enum):
+    """ Extraction priority classes, lower values are dispatched first. """
+
+    INTERACTIVE = 0 # A user is waiting on a single track (/playnow, /replace, playback)
+    BULK = 1 # Multiple queries or playlists (/add, playlist commands)
+    BACKGROUND = 2 # Nobody is waiting on the result (prefetching)
+
+class SlotRequest:
+    """ A request for an extraction slot for `guild_id` at `priority`, passed to `ExtractorScheduler.acquire()` or `ExtractorScheduler.slot()`.
+
+    Its priority can be raised with `ExtractorScheduler.raise_priority()`, before or while it waits. """
+
+    def __init__(self, guild_id: Hashable, priority: ExtractionPriority=ExtractionPriority.INTERACTIVE):
+        self.guild_id = guild_id
+        self.priority = priority
+        self.future = None # Set once queued, resolved once a slot is granted
+
+class SlotLease:
+    """ An extraction slot granted by `ExtractorScheduler.acquire()` or `ExtractorScheduler.slot()`.
+
+    `waited`: Time spent waiting for the slot, in seconds.
+
+    Threads passed to `hold()` keep the slot in use until they return, even past the `async with` block. """
+
+    def __init__(self, waited: float):
+        self.waited = waited
+        self.threads = set()
+
+    def hold(self, thread: asyncio.Future) -> None:
+        """ Keep the slot in use until `thread` is done. """
+
+        self.threads.add(thread)
+        thread.add_done_callback(self._on_thread_done)
+
+    def _on_thread_done(self, thread: asyncio.Future) -> None:
+        self.threads.discard(thread)
+
+        if not thread.cancelled():
+            thread.exception() # Mark as retrieved, abandoned threads' errors are not waited on
+
+class ExtractorScheduler:
+    """ Fair-share scheduler for extraction slots.
+
+    At most `slots` extractions run at the same time. It should match the amount of YoutubeDL instances (or worker processes)
+    available, so an extraction thread never waits for one. Waiting extractions are queued per priority class and per guild:
+    higher priority classes are always dispatched first, guilds in the same class take turns (round-robin), so a guild
+    extracting a large playlist cannot starve the others.
+
+    Queue-wait times are recorded per priority class, see `get_wait_stats()`. """
+
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+
+        self._active = 0
+        self._waiters = {priority: OrderedDict() for priority in ExtractionPriority}
+        self._wait_stats = {priority: {"count": 0, "total": 0.0, "max": 0.0} for priority in ExtractionPriority}
+
+    def _queue(self, request: SlotRequest) -> None:
+        self._waiters[request.priority].setdefault(request.guild_id, deque()).append(request)
+
+    def _pop_next_waiter(self) -> SlotRequest | None:
+        """ Return the next waiting request to dispatch, or None if nothing is waiting. """
+
+        for priority in ExtractionPriority:
+            guild_queues = self._waiters[priority]
+
+            while guild_queues:
+                guild_id, waiters = guild_queues.popitem(last=False)
+                request = waiters.popleft()
+
+                if waiters:
+                    guild_queues[guild_id] = waiters # Back of the line for this guild
+
+                if not request.future.done(): # Skip cancelled waiters
+                    return request
+
+        return None
+
+    def _dispatch(self) -> None:
+        while self._active < self.slots:
+            request = self._pop_next_waiter()
+            if request is None:
+                break
+
+            self._active += 1
+            request.future.set_result(None)
+
+    def _record_wait(self, priority: ExtractionPriority, waited: float) -> None:
+        stats = self._wait_stats[priority]
+
+        stats["count"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+
+        if waited >= EXTRACTOR_WAIT_LOG_THRESHOLD_SECONDS:
+            log(f"[EXTRACTOR] {priority.name} extraction waited {waited:.2f}s for a slot ({self._active}/{self.slots} slots in use).")
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    async def acquire(self, request: SlotRequest) -> SlotLease:
+        """ Queue `request` and wait for its extraction slot. It must be given back with `release()`. """
+
+        request.future = asyncio.get_running_loop().create_future()
+        self._queue(request)
+        start = monotonic()
+
+        self._dispatch() # Resolves the request right away if a slot is free
+
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled(): # Got a slot right before being cancelled, give it back
+                self._release()
+            raise
+
+        waited = monotonic() - start
+        self._record_wait(request.priority, waited)
+
+        return SlotLease(waited)
+
+    def raise_priority(self, request: SlotRequest, priority: ExtractionPriority) -> None:
+        """ Raise the priority of `request` to `priority` if it is lower. A waiting request moves to the back of its guild's queue in its new class. """
+
+        if priority.value >= request.priority.value:
+            return
+        
+        old_priority = request.priority
+        request.priority = priority
+
+        if request.future is None or request.future.done(): # Not queued yet or already dispatched
+            return
+        
+        guild_queues = self._waiters[old_priority]
+        waiters = guild_queues.get(request.guild_id)
+        if waiters is not None and request in waiters:
+            waiters.remove(request)
+            if not waiters:
+                del guild_queues[request.guild_id]
+
+        self._queue(request)
+
+    def release(self, lease: SlotLease) -> None:
+        """ Give back the slot of `lease` once every thread it holds returns. """
+
+        if lease.threads:
+            asyncio.gather(*lease.threads, return_exceptions=True).add_done_callback(lambda _: self._release())
+        else:
+            self._release()
+
+    @asynccontextmanager
+    async def slot(self, request: SlotRequest) -> AsyncIterator[SlotLease]:
+        """ Wait for the extraction slot of `request` and hold it for the duration of the `async with` block,
+        then until every thread held by the yielded `SlotLease` returns. """
+
+        lease = await self.acquire(request)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def get_wait_stats(self) -> dict[str, dict[str, float | int]]:
+        """ Return the amount of dispatched extractions, the average and the maximum queue-wait time in seconds, per priority class. 
+        Also include the amount of slots in use and extractions currently waiting. """
+
+        stats = {
+            priority.name: {
+                "count": stats["count"],
+                "average_wait": stats["total"] / stats["count"] if stats["count"] else 0.0,
+                "max_wait": stats["max"],
+                "waiting": sum(1 for waiters in self._waiters[priority].values() for request in waiters if not request.future.done())
+            } for priority, stats in self._wait_stats.items()
+        }
+        stats["slots"] = {"active": self._active, "total": self.slots}
+
+        return stats
+
+# Shared by every guild. Replaces a plain semaphore so bulk extractions can't starve interactive ones.
+# One slot per YoutubeDL instance (or worker process), so extractions wait here instead of blocking a thread.
+EXTRACTOR_SCHEDULER = ExtractorScheduler(EXTRACTOR_PROCESS_COUNT if EXTRACTOR_PROCESS_POOL is not None else YDL_POOL_SIZE)
+
+# Returned by extractions stopped with stop_extractions(). Compared by identity.
+STOPPED_EXTRACTION_ERROR = Error("Extraction stopped.")
+
+# Extraction deadlines and stopping
+async def run_with_deadline(abort: Event, lease: SlotLease, func: Callable[..., Any], *args: Any) -> Any:
+    """ Run `func(*args)` in a thread for at most `EXTRACTION_TIMEOUT` seconds, using the extraction slot of `lease`. 
+    
+    `abort` is set if the deadline is exceeded or the caller is cancelled, so extractions in worker processes get killed.
+    Threads can't be killed, those keep running in the background but stop being waited on. They keep the slot in use until they return.
+
+    Raises TimeoutError if the deadline is exceeded. """
+
+    thread = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    lease.hold(thread)
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(thread), EXTRACTION_TIMEOUT)
+    except BaseException:
+        abort.set()
+        raise
+
+async def run_stoppable(guild_states: dict[str, Any], interaction: Interaction, coro: Awaitable[Any]) -> Any:
+    """ Run extraction coroutine `coro` as a task `stop_extractions()` can cancel. 
+    
+    Return its result or `STOPPED_EXTRACTION_ERROR` if it was stopped. """
+
+    task = asyncio.ensure_future(coro)
+    tasks = guild_states[interaction.guild.id]["extraction_tasks"] if interaction.guild.id in guild_states else set()
+    tasks.add(task)
+
+    try:
+        await asyncio.wait((task,)) # Unlike awaiting the task, tells its cancellation apart from the caller's
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        tasks.discard(task)
+
+    if task.cancelled():
+        return STOPPED_EXTRACTION_ERROR
+    
+    return task.result()
+
+def stop_extractions(guild_states: dict[str, Any], interaction: Interaction) -> None:
+    """ Stop every extraction of a guild. Queued queries won't start and queries being extracted are aborted. """
+
+    update_guild_state(guild_states, interaction, False, "can_extract")
+
+    if interaction.guild.id in guild_states:
+        for task in guild_states[interaction.guild.id]["extraction_tasks"]:
+            task.cancel()
 
 # Functions for fetching stuff from source websites
+async def fetch_single_flight(
+        query: str, 
+        query_type: QueryType, 
+        allow_cache: bool=True, 
+        max_entries: int | None=None,
+        guild_id: int | None=None,
+        priority: ExtractionPriority=ExtractionPriority.INTERACTIVE,
+        metadata_only: bool=False,
+        session: ClientSession | None=None
+    ) -> Track | list[Track] | dict[str, Any] | list[dict[str, Any]] | Error:
+    """ Run `fetch()` (or `fetch_metadata()` if `metadata_only` is True) in a thread once the extractor scheduler grants a slot to `guild_id` at `priority`, 
+    sharing a single extraction between concurrent calls for the same query.
+
+    Calls are matched by the query's canonical identity. The first caller extracts the query, the others wait for it and get a copy of its result (or its exception).
+    If the first caller is cancelled, a waiting caller takes over the extraction. A caller with a higher priority raises the priority of the shared extraction,
+    so e.g. playback never waits behind a background prefetch of the same track. 
+    
+    Extractions exceeding `EXTRACTION_TIMEOUT` are aborted and return an Error, which is stored in the negative cache. 
+    
+    If `session` is given, queries with a native extractor are extracted with it directly, without waiting for a slot. 
+    yt-dlp is used if the native extractor fails. """
+
+    key = (get_cache_key(query_type, max_entries), allow_cache, metadata_only) # Never join a cache-enabled extraction when a fresh one is needed
+
+    while key in EXTRACTOR_IN_FLIGHT:
+        in_flight, request = EXTRACTOR_IN_FLIGHT[key]
+        EXTRACTOR_SCHEDULER.raise_priority(request, priority)
+
+        await asyncio.wait((in_flight,)) # Never cancels `in_flight` if we get cancelled
+        if in_flight.cancelled():
+            continue # The extracting caller was cancelled, not us
+        
+        return deepcopy(in_flight.result())
+
+    in_flight = asyncio.get_running_loop().create_future()
+    request = SlotRequest(guild_id, priority)
+    EXTRACTOR_IN_FLIGHT[key] = (in_flight, request)
+
+    try:
+        result = None
+        if session is not None and not session.closed and has_native_extractor(query_type):
+            result = await fetch_native(session, query, query_type, allow_cache)
+            if result is not None and metadata_only:
+                result = get_playlist_track(result)
+
+        if result is None:
+            async with EXTRACTOR_SCHEDULER.slot(request) as lease:
+                EXTRACTOR_METRICS.observe("slot_wait_seconds", query_type.source_website, lease.waited)
+                abort = Event()
+
+                try:
+                    func = fetch_metadata if metadata_only else fetch
+                    result = await run_with_deadline(abort, lease, func, query, query_type, allow_cache, max_entries, abort)
+                except TimeoutError:
+                    error = Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` took too long and was aborted.")
+                    result = store_failure(get_cache_key(query_type, max_entries), error, "timeout", query_type.source_website)
+    except asyncio.CancelledError:
+        in_flight.cancel()
+        raise
+    except BaseException as e:
+        in_flight.set_exception(e)
+        in_flight.exception() # Mark as retrieved, waiters (if any) re-raise it themselves
+        raise
+    else:
+        in_flight.set_result(result)
+        return result
+    finally:
+        EXTRACTOR_IN_FLIGHT.pop(key, None)
+
 async def fetch_query(
         guild_states: dict[str, Any],
         interaction: Interaction,
@@ -18,9 +339,21 @@ async def fetch_query(
         extraction_state_max_length: int=1,
         query_name: str=None,
         allowed_query_types: tuple[SourceWebsiteValue] | None=None,
-        provider: SearchWebsiteIDValue | None=None
-    ) -> dict[str, Any] | list[dict[str, Any]] | Error:
-    """ Extract a query from its website, catch any errors and return the result. """
+        provider: SearchWebsiteIDValue | None=None,
+        max_entries: int | None=None,
+        priority: ExtractionPriority=ExtractionPriority.INTERACTIVE,
+        metadata_only: bool=False
+    ) -> Track | list[Track] | dict[str, Any] | list[dict[str, Any]] | Error:
+    """ Extract a query from its website, catch any errors and return the result. 
+
+    Queries that failed recently return their cached Error without being extracted again.
+    Return `STOPPED_EXTRACTION_ERROR` if the extraction was stopped with `stop_extractions()`.
+    
+    `max_entries` is the maximum amount of tracks to extract from a playlist query. 
+    
+    `priority` is the scheduling class of the extraction, single-track commands should keep the default. 
+    
+    If `metadata_only` is True, stream URLs are not resolved and tracks are returned as playlist track hashmaps (see `fetch_metadata()`). """
     
     query = query.strip()
 
@@ -32,6 +365,10 @@ async def fetch_query(
     if allowed_query_types is not None and query_type.source_website not in allowed_query_types:
         return Error(f"Query type **{query_type.source_website}** not supported for this command!")
 
+    failure = get_cached_failure(query_type, max_entries)
+    if failure is not None: # Failed recently, don't hit the website again
+        return failure
+
     update_query_extraction_state(
         guild_states, 
         interaction, 
@@ -41,10 +378,19 @@ async def fetch_query(
         query_type.source_website
     )
 
-    async with EXTRACTOR_SEMAPHORE:
-        extracted_track = await asyncio.to_thread(fetch, query, query_type)
-
-    return extracted_track
+    return await run_stoppable(
+        guild_states, 
+        interaction, 
+        fetch_single_flight(
+            query, 
+            query_type, 
+            max_entries=max_entries, 
+            guild_id=interaction.guild.id, 
+            priority=priority, 
+            metadata_only=metadata_only, 
+            session=interaction.client.client_http_session
+        )
+    )
 
 async def fetch_queries(
         guild_states: dict[str, Any],
@@ -53,73 +399,307 @@ async def fetch_queries(
         query_names: list[str] | None=None,
         allowed_query_types: tuple[SourceWebsiteValue]=None,
         provider: SearchWebsiteIDValue | None=None,
-        ignore_errors: bool=False
-    ) -> list[dict[str, Any]] | Error:
-    """ Extract a list of queries and return the result. 
+        ignore_errors: bool=False,
+        max_concurrency: int=MAX_CONCURRENT_QUERY_EXTRACTIONS,
+        max_results: int | None=None,
+        priority: ExtractionPriority=ExtractionPriority.BULK,
+        metadata_only: bool=False
+    ) -> list[Track] | list[dict[str, Any]] | Error:
+    """ Extract a list of queries concurrently and return the result in the same order as `queries`. 
     
+    At most `max_concurrency` queries are extracted at the same time. A value of 1 extracts them one by one.
+
+    `max_results` is the maximum amount of tracks the caller can use (e.g. the remaining queue slots). 
+    Saved tracks past it are dropped before extraction and playlists stop extracting at it. Results past it may still be returned.
+
     `allowed_query_types` must be a tuple containing SourceWebsite enum values. 
     
-    `provider` must be a SourceWebsite search website enum value. (if used) """
+    `provider` must be a SourceWebsite search website enum value. (if used) 
+    
+    `metadata_only` returns playlist track hashmaps without resolving stream URLs, for commands that only store tracks. """
 
     found = []
+
+    if max_results is not None:
+        max_results = max(1, max_results)
+
+        # Every saved track (hashmap) is a single result, extracting the ones past the budget would be wasted.
+        saved_tracks_count = sum(1 for query in queries if isinstance(query, dict))
+        if saved_tracks_count == len(queries):
+            queries = queries[:max_results]
+            query_names = query_names[:max_results] if isinstance(query_names, list) else query_names
+
     queries_length = len(queries)
     is_query_names_list = isinstance(query_names, list)
 
     if is_query_names_list and\
         queries_length != len(query_names):
         query_names = None
+        is_query_names_list = False
 
     update_guild_state(guild_states, interaction, True, "can_extract")
 
-    can_extract = guild_states[interaction.guild.id]["can_extract"]
-    for i, query in enumerate(queries):
-        can_extract = guild_states[interaction.guild.id]["can_extract"]
-        if not can_extract:
-            break
+    results = [None] * queries_length
+    completed = 0
+    query_semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
-        extracted_query = await fetch_query(guild_states, interaction,
-            query=query if not isinstance(query, dict) else query["webpage_url"],
-            extraction_state_amount=i + 1,
-            extraction_state_max_length=queries_length,
-            query_name=query_names[i] if is_query_names_list else None,
-            allowed_query_types=allowed_query_types,
-            provider=provider
-        )
+    async def _fetch(i: int, query: str | dict[str, Any]) -> None:
+        nonlocal completed
+
+        async with query_semaphore:
+            # Checked once a slot is free, so /stop-extraction prevents any queued query from starting.
+            if not guild_states[interaction.guild.id]["can_extract"]:
+                return
+
+            extracted_query = await fetch_query(guild_states, interaction,
+                query=query if not isinstance(query, dict) else query["webpage_url"],
+                extraction_state_amount=completed + 1,
+                extraction_state_max_length=queries_length,
+                query_name=query_names[i] if is_query_names_list else None,
+                allowed_query_types=allowed_query_types,
+                provider=provider,
+                max_entries=max_results,
+                priority=priority,
+                metadata_only=metadata_only
+            )
+
+        completed += 1
+        if extracted_query is STOPPED_EXTRACTION_ERROR:
+            return
+        
+        results[i] = extracted_query
+
+        if isinstance(extracted_query, Error) and not ignore_errors:
+            update_guild_state(guild_states, interaction, False, "can_extract") # Stop the remaining queries
 
+    tasks = [asyncio.create_task(_fetch(i, query)) for i, query in enumerate(queries)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        
+        update_guild_state(guild_states, interaction, False, "can_extract")
+        raise
+
+    for extracted_query in results:
         if isinstance(extracted_query, Error) and not ignore_errors:
-            if can_extract:
-                update_guild_state(guild_states, interaction, False, "can_extract")
+            update_guild_state(guild_states, interaction, False, "can_extract")
             
             return extracted_query
         elif isinstance(extracted_query, list):
             found.extend(extracted_query)
-        elif isinstance(extracted_query, dict):
+        elif isinstance(extracted_query, (Track, dict)):
             found.append(extracted_query)
     
-    if can_extract:
-        update_guild_state(guild_states, interaction, False, "can_extract")
+    update_guild_state(guild_states, interaction, False, "can_extract")
     
     if not found:
         return Error("Could not extract any track.")
 
     return found
 
-async def resolve_expired_url(webpage_url: str) -> dict[str, Any] | None:
+async def stream_playlist(
+        guild_states: dict[str, Any],
+        interaction: Interaction,
+        query: str,
+        allowed_query_types: tuple[SourceWebsiteValue] | None=None,
+        max_entries: int | None=None
+    ) -> AsyncIterator[Track | Error]:
+    """ Extract a playlist URL and yield its tracks one by one as soon as they are extracted, updating the extraction progress state live.
+
+    At most `max_entries` tracks are extracted, if given.
+
+    Stop after yielding an Error, when the `can_extract` guild state is set to False or when stopped with `stop_extractions()`.
+    Each entry must be extracted within `EXTRACTION_TIMEOUT` seconds. 
+    
+    A single extraction slot is held for the whole playlist, as its YoutubeDL instance stays checked out between entries. """
+
+    query = query.strip()
+    query_type = get_query_type(query, None)
+
+    if allowed_query_types is not None and query_type.source_website not in allowed_query_types:
+        yield Error(f"Query type **{query_type.source_website}** not supported for this command!")
+        return
+
+    failure = get_cached_failure(query_type, max_entries)
+    if failure is not None:
+        yield failure
+        return
+
+    update_query_extraction_state(guild_states, interaction, 0, 0, query, query_type.source_website)
+    
+    abort = Event()
+    playlist = iter_playlist(query, query_type, max_entries, abort)
+
+    async def _next_entry(lease: SlotLease) -> tuple[int, int, Track] | Error | None:
+        try:
+            return await run_with_deadline(abort, lease, next, playlist, None)
+        except TimeoutError:
+            return Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` took too long and was aborted.")
+
+    lease = await run_stoppable(guild_states, interaction, EXTRACTOR_SCHEDULER.acquire(SlotRequest(interaction.guild.id, ExtractionPriority.BULK)))
+    if lease is STOPPED_EXTRACTION_ERROR:
+        playlist.close()
+        return
+
+    try:
+        while guild_states[interaction.guild.id]["can_extract"]:
+            result = await run_stoppable(guild_states, interaction, _next_entry(lease))
+
+            if result is None or result is STOPPED_EXTRACTION_ERROR:
+                break
+            elif isinstance(result, Error):
+                yield result
+                break
+
+            position, total, track = result
+            update_query_extraction_state(guild_states, interaction, position, total, track["title"], query_type.source_website)
+
+            yield track
+    finally:
+        abort.set()
+
+        if lease.threads: # Still running in a thread after a cancellation, close it (and check its YoutubeDL instance back in) once it returns
+            asyncio.gather(*lease.threads, return_exceptions=True).add_done_callback(lambda _: playlist.close())
+        else:
+            playlist.close()
+
+        EXTRACTOR_SCHEDULER.release(lease)
+
+async def stream_queries(
+        guild_states: dict[str, Any],
+        interaction: Interaction,
+        queries: list[str],
+        allowed_query_types: tuple[SourceWebsiteValue] | None=None,
+        provider: SearchWebsiteIDValue | None=None,
+        max_concurrency: int=MAX_CONCURRENT_QUERY_EXTRACTIONS,
+        max_results: int | None=None
+    ) -> AsyncIterator[Track | Error]:
+    """ Extract a list of queries and yield their tracks in the same order as `queries`, as soon as each one is available.
+
+    Playlist URLs are streamed entry by entry with `stream_playlist()`. Other queries are extracted concurrently in the background, 
+    at most `max_concurrency` at a time.
+
+    `max_results` is the maximum amount of tracks to yield. Playlists only extract the entries that still fit in it.
+
+    Stop after yielding the first Error, or when the `can_extract` guild state is set to False. 
+    Must be closed (e.g. with `contextlib.aclosing()`) if not exhausted, so pending extractions get cancelled. """
+
+    queries_length = len(queries)
+    query_semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    priority = ExtractionPriority.INTERACTIVE if queries_length == 1 else ExtractionPriority.BULK
+
+    update_guild_state(guild_states, interaction, True, "can_extract")
+
+    async def _fetch(i: int, query: str) -> Track | list[Track] | Error | None:
+        async with query_semaphore:
+            if not guild_states[interaction.guild.id]["can_extract"]:
+                return None
+
+            return await fetch_query(guild_states, interaction, query,
+                extraction_state_amount=i + 1,
+                extraction_state_max_length=queries_length,
+                allowed_query_types=allowed_query_types,
+                provider=provider,
+                max_entries=max_results,
+                priority=priority
+            )
+
+    tasks = {
+        i: asyncio.create_task(_fetch(i, query)) for i, query in enumerate(queries)
+        if get_query_type(query.strip(), provider).source_website not in PLAYLIST_WEBSITES
+    }
+
+    yielded = 0
+
+    try:
+        for i, query in enumerate(queries):
+            remaining = max_results - yielded if max_results is not None else None
+            
+            if not guild_states[interaction.guild.id]["can_extract"] or\
+                (remaining is not None and remaining <= 0):
+                break
+
+            if i not in tasks:
+                async with aclosing(stream_playlist(guild_states, interaction, query, allowed_query_types, remaining)) as playlist:
+                    async for result in playlist:
+                        yield result
+
+                        if isinstance(result, Error):
+                            return
+                        
+                        yielded += 1
+
+                continue
+
+            result = await tasks[i]
+            if result is None or result is STOPPED_EXTRACTION_ERROR:
+                break
+            elif isinstance(result, Error):
+                yield result
+                return
+
+            for track in result if isinstance(result, list) else [result]:
+                if remaining is not None and yielded >= max_results:
+                    break
+
+                yield track
+                yielded += 1
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+        update_guild_state(guild_states, interaction, False, "can_extract")
+
+async def resolve_expired_url(
+        webpage_url: str, 
+        guild_id: int | None=None, 
+        priority: ExtractionPriority=ExtractionPriority.INTERACTIVE,
+        session: ClientSession | None=None
+    ) -> Track | None:
     """ Fetch a new track object based on the current webpage URL.
     
-    Unlike `fetch()`, this function returns None on failure. """
+    Unlike `fetch()`, this function returns None on failure. Both the extractor cache and the negative cache are bypassed. """
     
     provider = None
     query_type = get_query_type(webpage_url, provider)
     
-    async with EXTRACTOR_SEMAPHORE:
-        new_extracted_track = await asyncio.to_thread(fetch, webpage_url, query_type, False) # Do not use caching as it will pull invalid data
+    new_extracted_track = await fetch_single_flight(webpage_url, query_type, False, guild_id=guild_id, priority=priority, session=session) # Do not use caching as it will pull invalid data
     
     if isinstance(new_extracted_track, Error):
         return None
     
     return new_extracted_track
 
+async def warm_up_extractor_cache(track_count: int, session: ClientSession | None=None) -> int:
+    """ Extract the `track_count` most saved tracks across every guild's playlists (see `rank_saved_tracks()`) into the extractor cache.
+
+    Tracks are extracted one by one at background priority, so user commands always get an extractor slot first.
+
+    Return the amount of successfully extracted tracks. """
+
+    contents = await asyncio.to_thread(read_all_guild_json, "playlists.json")
+    tracks = rank_saved_tracks(contents, canonicalize_url)[:track_count]
+    extracted = 0
+
+    for track in tracks:
+        query_type = get_query_type(track["webpage_url"], None)
+        if not query_type.is_url or\
+            query_type.source_website in PLAYLIST_WEBSITES or\
+            get_cached_failure(query_type) is not None or\
+            get_cached_tracks(query_type) is not None:
+            continue
+
+        # Bypass the cache, as fetch() returns tracks known to the metadata cache without extracting their stream
+        result = await fetch_single_flight(track["webpage_url"], query_type, False, priority=ExtractionPriority.BACKGROUND, session=session)
+        if not isinstance(result, Error):
+            extracted += 1
+
+        await asyncio.sleep(CACHE_WARM_UP_INTERVAL_SECONDS)
+
+    return extracted
+
 async def add_results_to_queue(interaction: Interaction, results: list[dict[str, Any]], queue: list, max_limit: int) -> list[dict[str, Any]]:
     """ Append found results to a queue in place.
 
@@ -1,35 +1,65 @@
 """ FFmpeg helper functions for discord.py bot """
 
-from settings import CAN_LOG, LOGGER
+from settings import CAN_LOG, LOGGER, FFMPEG_EXEC, PLAYBACK_MODE, STREAM_BUFFER_SIZE, AUDIO_CACHE
 from init.constants import (
-    PLAYBACK_END_GRACE_PERIOD, 
+    OPUS_COPY_PROTOCOLS, OPUS_AUDIO_CACHE_SUFFIX, PLAYBACK_END_GRACE_PERIOD, DEFAULT_STREAM_BUFFER_SIZE,
     MAX_RETRY_COUNT, MAX_STREAM_REFRESH_RETRY_COUNT, CRASH_RECOVERY_TIME_WINDOW,
     FFMPEG_RECONNECT_TIMEOUT_SECONDS, FFMPEG_READ_WRITE_TIMEOUT_MICROSECONDS,
-    IS_STREAM_URL_ALIVE_REQUEST_HEADERS
+    IS_STREAM_URL_ALIVE_REQUEST_HEADERS, STREAM_URL_EXPIRY_MARGIN
 )
-from webextractor import SourceWebsiteValue, FAST_SEEK_SUPPORT_DOMAINS
+from webextractor import SourceWebsiteValue, Track, FAST_SEEK_SUPPORT_DOMAINS, canonicalize_url
 from init.logutils import log_to_discord_log, log
-from helpers.extractorhelpers import resolve_expired_url
-from helpers.guildhelpers import update_guild_state, update_guild_states
+from helpers.extractorhelpers import ExtractionPriority, resolve_expired_url
+from helpers.guildhelpers import update_guild_state, update_guild_states, get_playback_position
 from helpers.timehelpers import format_to_minutes, format_to_seconds
+from streambuffer import StreamBuffer
+from audiosource import StreamBufferedSource
 
 import discord
 from aiohttp import ClientSession
 from discord.interactions import Interaction
-from typing import Any, Awaitable, Callable
-from time import monotonic
+from typing import Any, Awaitable, Callable, Literal
+from time import monotonic, time
+from shlex import quote
+
+FFmpegInputValue = Literal["url", "pipe", "file"]
 
 # FFmpeg options, stream validation and ffmpeg crash handler.
-def get_ffmpeg_options(position: int, source_website: SourceWebsiteValue | None=None) -> dict[str, str]:
+def get_ffmpeg_options(
+        position: int, 
+        source_website: SourceWebsiteValue | None=None, 
+        http_headers: dict[str, str] | None=None, 
+        input_type: FFmpegInputValue="url"
+    ) -> dict[str, str]:
     """ Return a hashmap containing ffmpeg `before_options` and `options` in their respective keys.
 
-    Additionally, seek position may be passed as function parameter `position`, which will be added after the `-ss` flag in `options` or `before_options` if supported. """
+    Additionally, seek position may be passed as function parameter `position`, which will be added after the `-ss` flag in `options` or `before_options` if supported. 
+    
+    `http_headers` are the headers the stream URL must be requested with, if any.
+
+    `input_type` is what FFmpeg reads from: a stream `url`, a stream `pipe`d to its stdin (can't be reconnected to, only seeked in by decoding) 
+    or a local `file` (always seeked in before decoding). """
+
+    if input_type != "url":
+        options = {
+            "before_options": "",
+            "options": f"-vn -threads 1"
+        }
+
+        if position > 0:
+            options["before_options" if input_type == "file" else "options"] += f" -ss {position}"
+        
+        return options
     
     options = {
         "before_options": f"-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max {FFMPEG_RECONNECT_TIMEOUT_SECONDS} -rw_timeout {FFMPEG_READ_WRITE_TIMEOUT_MICROSECONDS}",
         "options": f"-vn -threads 1"
     }
 
+    if http_headers:
+        headers = "".join(f"{name}: {value}\r\n" for name, value in http_headers.items())
+        options["before_options"] += f" -headers {quote(headers)}"
+
     if position > 0:
         if source_website not in FAST_SEEK_SUPPORT_DOMAINS:
             options["options"] += f" -ss {position}"
@@ -38,6 +68,115 @@ def get_ffmpeg_options(position: int, source_website: SourceWebsiteValue | None=
 
     return options
 
+def can_copy_opus(track: Track) -> bool:
+    """ Return whether the stream of `track` is Opus and can be sent to Discord as-is, without decoding and re-encoding it.
+
+    Only streams served over plain HTTP(S) are copied, segmented (e.g. HLS) streams are always re-encoded. """
+
+    return track.get("acodec") == "opus" and track.get("protocol") in OPUS_COPY_PROTOCOLS
+
+def can_copy_cached_opus(cached_audio: str) -> bool:
+    """ Return whether audio cache file `cached_audio` holds Opus audio. 
+    
+    Decided from the codec recorded when the file was written, as the track's current stream may have another format. """
+
+    return cached_audio.endswith(OPUS_AUDIO_CACHE_SUFFIX)
+
+def can_buffer_stream(track: Track) -> bool:
+    """ Return whether the stream of `track` can be downloaded through a `StreamBuffer` and piped to FFmpeg.
+
+    Requires `stream_buffer_size_kb` or `audio_cache_size_mb` to be enabled. Only single-file streams served over plain HTTP(S) are buffered. """
+
+    return (STREAM_BUFFER_SIZE > 0 or AUDIO_CACHE is not None) and track.get("protocol") in OPUS_COPY_PROTOCOLS
+
+def get_cached_audio(track: Track) -> str | None:
+    """ Return the path of the audio cache file of `track`, or None if the audio cache is disabled or has no file for it. """
+
+    if AUDIO_CACHE is None or not track.get("webpage_url"):
+        return None
+    
+    return AUDIO_CACHE.get(canonicalize_url(track["webpage_url"]))
+
+def get_ffmpeg_input_type(track: Track, position: int, cached_audio: str | None=None, session: ClientSession | None=None) -> FFmpegInputValue:
+    """ Return what FFmpeg should read `track` from when playing it from `position`.
+
+    A cached file (`cached_audio`) is always preferred. Streams are only piped through a `StreamBuffer` when played from the start: 
+    piped input can only be seeked in by decoding it, which would download and decode everything before `position`. """
+
+    if cached_audio is not None:
+        return "file"
+    
+    if session is not None and position <= 0 and can_buffer_stream(track):
+        return "pipe"
+    
+    return "url"
+
+def create_audio_source(track: Track, position: int, session: ClientSession | None=None) -> discord.AudioSource:
+    """ Spawn an FFmpeg process playing the stream of `track` from `position` and return it as an audio source, based on the configured playback mode.
+    
+    In `opus` mode, FFmpeg outputs Opus packets, copied from the stream when possible (see `can_copy_opus()`) or encoded by FFmpeg otherwise.
+    In `pcm` mode, FFmpeg outputs PCM which discord.py encodes to Opus in-process.
+
+    A file in the audio cache is played instead of the stream if available (see `get_cached_audio()`). Its audio is copied only if it was written from an Opus stream.
+    Otherwise, if a `session` (the bot's buffered stream session) is given and the stream can be buffered (see `get_ffmpeg_input_type()`), it is downloaded with it, piped to FFmpeg 
+    and written to the audio cache if enabled. The source is then wrapped in a `StreamBufferedSource`. Must be called from the event loop in that case. """
+
+    cached_audio = get_cached_audio(track)
+    input_type = get_ffmpeg_input_type(track, position, cached_audio, session)
+    stream_buffer = None
+    
+    if input_type == "pipe":
+        cache_fill = AUDIO_CACHE.open_fill(
+            canonicalize_url(track["webpage_url"]), 
+            OPUS_AUDIO_CACHE_SUFFIX if can_copy_opus(track) else ""
+        ) if AUDIO_CACHE is not None and track.get("webpage_url") else None
+        stream_buffer = StreamBuffer(track["url"], track.get("http_headers"), STREAM_BUFFER_SIZE or DEFAULT_STREAM_BUFFER_SIZE, cache_fill)
+
+    if input_type == "file":
+        ffmpeg_options = get_ffmpeg_options(position, input_type="file")
+        ffmpeg_input = cached_audio
+        can_copy = can_copy_cached_opus(cached_audio)
+    elif input_type == "pipe":
+        ffmpeg_options = get_ffmpeg_options(position, input_type="pipe")
+        ffmpeg_input = stream_buffer
+        can_copy = can_copy_opus(track)
+    else:
+        ffmpeg_options = get_ffmpeg_options(position, track["source_website"], track.get("http_headers"))
+        ffmpeg_input = track["url"]
+        can_copy = can_copy_opus(track)
+
+    try:
+        if PLAYBACK_MODE == "pcm":
+            source = discord.FFmpegPCMAudio(
+                ffmpeg_input, 
+                executable=FFMPEG_EXEC, 
+                pipe=stream_buffer is not None, 
+                options=ffmpeg_options["options"], 
+                before_options=ffmpeg_options["before_options"]
+            )
+        else:
+            source = discord.FFmpegOpusAudio(
+                ffmpeg_input, 
+                codec="opus" if can_copy else None, # "opus" makes discord.py pass -c:a copy, anything else encodes with libopus
+                executable=FFMPEG_EXEC, 
+                pipe=stream_buffer is not None, 
+                options=ffmpeg_options["options"], 
+                before_options=ffmpeg_options["before_options"]
+            )
+    except Exception:
+        if stream_buffer is not None:
+            stream_buffer.close()
+
+            if stream_buffer.cache_fill is not None:
+                stream_buffer.cache_fill.abort()
+        raise
+
+    if stream_buffer is None:
+        return source
+    
+    stream_buffer.start(session)
+    return StreamBufferedSource(source, stream_buffer)
+
 async def is_stream_url_alive(url: str, session: ClientSession) -> bool:
     """ Check if a stream URL is accessible asynchronously with timeout in seconds.
     
@@ -57,8 +196,31 @@ async def is_stream_url_alive(url: str, session: ClientSession) -> bool:
         log_to_discord_log(f"An error occured while validating stream URL {url}\nErr: {e}", "error", CAN_LOG, LOGGER)
         return False
 
-async def check_stream(interaction: Interaction, session: ClientSession, track: dict[str, Any], tries: int) -> dict[str, Any]:
+def get_stream_freshness(track: Track) -> bool | None:
+    """ Check a track's stream URL against its known expiry, if any.
+
+    Return True if it is known to be valid for at least `STREAM_URL_EXPIRY_MARGIN` seconds, False if it expires sooner or None if the expiry is unknown. """
+
+    expires_at = track.get("stream_expires_at")
+    if expires_at is None:
+        return None
+
+    return expires_at - time() > STREAM_URL_EXPIRY_MARGIN
+
+async def check_stream(
+        interaction: Interaction, 
+        session: ClientSession, 
+        track: Track, 
+        tries: int, 
+        priority: ExtractionPriority=ExtractionPriority.INTERACTIVE,
+        force_refresh: bool=False
+    ) -> Track:
     """ Ping stream to ensure it is valid and return a track hashmap. 
+
+    Streams with a known expiry are not pinged: they are considered valid if not about to expire, otherwise they are refreshed right away.
+    Tracks without a stream URL (lazily extracted playlist entries) are resolved right away as well, scheduled at `priority`.
+
+    If `force_refresh` is True, the current stream URL is resolved again without being checked (e.g. after FFmpeg crashed on it). 
     
     Raises ValueError if stream is invalid and tries have been exceeded. """
 
@@ -74,10 +236,16 @@ async def check_stream(interaction: Interaction, session: ClientSession, track:
         if track is None:
             _bail_out(i+1)
 
-        is_stream_alive = await is_stream_url_alive(track["url"], session)
+        if force_refresh and i == 0:
+            is_stream_alive = False
+        else:
+            is_stream_alive = get_stream_freshness(track) if track.get("url") else False
+        if is_stream_alive is None:
+            is_stream_alive = await is_stream_url_alive(track["url"], session)
+
         if not is_stream_alive:
-            log(f"[GUILDSTATE][SHARD ID {interaction.guild.shard_id}] (Try {i+1}) Resolving expired URL in guild ID {interaction.guild.id}")
-            track = await resolve_expired_url(track["webpage_url"])
+            log(f"[GUILDSTATE][SHARD ID {interaction.guild.shard_id}] (Try {i+1}) Resolving {'expired' if track.get('url') else 'lazy'} URL in guild ID {interaction.guild.id}")
+            track = await resolve_expired_url(track["webpage_url"], interaction.guild.id, priority, session)
         else:
             track["title"] = old_title
             track["source_website"] = old_source_website
@@ -89,7 +257,7 @@ async def check_stream(interaction: Interaction, session: ClientSession, track:
 async def handle_player_crash(
         interaction: Interaction,
         stream_url_checks_session: ClientSession,
-        current_track: dict[str, Any], 
+        current_track: Track, 
         voice_client: discord.VoiceClient,
         resume_time: int,
         play_track_func: Callable[..., Awaitable[Any]]
@@ -101,7 +269,7 @@ async def handle_player_crash(
 
     try:
         log(f"[GUILDSTATE][SHARD ID {interaction.guild.shard_id}] Resolving stream URL for crash handler in guild ID {interaction.guild.id}")
-        new_track = await check_stream(interaction, stream_url_checks_session, current_track, MAX_STREAM_REFRESH_RETRY_COUNT)
+        new_track = await check_stream(interaction, stream_url_checks_session, current_track, MAX_STREAM_REFRESH_RETRY_COUNT, force_refresh=True)
 
         await play_track_func(
             interaction, 
@@ -116,10 +284,10 @@ async def handle_player_crash(
         log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
         return False
 
-def track_ended_early(track: dict[str, Any], start_time: int) -> bool:
-    """ Check if a track has ended early with a grace period to avoid false positives. """
+def track_ended_early(track: Track, position: float) -> bool:
+    """ Check if a track has ended early at playback `position` with a grace period to avoid false positives. """
     
-    current_time = int(monotonic() - start_time)
+    current_time = int(position)
     track_duration_in_seconds = format_to_seconds(track["duration"])
     expected_elapsed_time = track_duration_in_seconds - PLAYBACK_END_GRACE_PERIOD
     
@@ -137,11 +305,6 @@ def recovery_count_over_limit(recovery_count: int, last_recovery_time: float) ->
 
     return False
 
-def get_approximate_resume_time(current_time: int, track_duration_in_seconds: int) -> int:
-    """ Given a crash time and the total duration, return the approximate resume time. """
-    
-    return max(0, int(current_time - (track_duration_in_seconds - current_time) * 0.1))
-
 async def check_player_crash(
         interaction: Interaction, 
         stream_url_checks_session: ClientSession, 
@@ -150,24 +313,24 @@ async def check_player_crash(
     ) -> bool:
     """ Check if the voice player has crashed. 
     
-    If so, try to restore playback at a position close to where it crashed. """
+    If so, try to restore playback at the position it crashed at. """
     
     current_track = guild_states[interaction.guild.id]["current_track"]
     user_forced = guild_states[interaction.guild.id]["user_interrupted_playback"]
     crash_recovery_count = guild_states[interaction.guild.id]["crash_recovery_count"]
     last_recovery_time = guild_states[interaction.guild.id]["last_recovery_time"]
-    start_time = guild_states[interaction.guild.id]["start_time"]
+    position = get_playback_position(guild_states, interaction)
     voice_client = guild_states[interaction.guild.id]["voice_client"]
     recovery_success = False
 
     if current_track is not None and not user_forced:
-        if track_ended_early(current_track, start_time) and not\
+        if track_ended_early(current_track, position) and not\
             recovery_count_over_limit(crash_recovery_count, last_recovery_time):
             
             update_guild_state(guild_states, interaction, True, "voice_client_locked")
 
-            approximate_resume_time = get_approximate_resume_time(int(monotonic() - start_time), format_to_seconds(current_track["duration"]))
-            resume_time_in_mins = format_to_minutes(approximate_resume_time)
+            resume_time = int(position)
+            resume_time_in_mins = format_to_minutes(resume_time)
 
             await interaction.channel.send(
                 f"Looks like the playback crashed at **{resume_time_in_mins}** due to a faulty stream.\nAttempting to recover.."
@@ -178,7 +341,7 @@ async def check_player_crash(
                 stream_url_checks_session, 
                 current_track, 
                 voice_client, 
-                approximate_resume_time, 
+                resume_time, 
                 play_track_func
             )
 
@@ -7,13 +7,16 @@ from helpers.iohelpers import read_file_json, write_file_json, ensure_paths
 from helpers.lockhelpers import check_file_lock
 from helpers.cachehelpers import get_cache, store_cache
 from init.logutils import log
+from audiosource import PositionTrackingSource
 
 import asyncio
 import discord
 from discord.interactions import Interaction
 from typing import Any, Literal, Callable
-from os.path import join
+from os import scandir
+from os.path import join, isfile
 from operator import eq
+from time import monotonic
 
 async def read_guild_json(
         interaction: Interaction,
@@ -54,6 +57,32 @@ async def read_guild_json(
 
         return content
     
+def read_all_guild_json(file_name: str) -> list[dict]:
+    """ Read the content of `file_name` in every guild data directory, without file locks or caching.
+
+    Missing and unreadable files are skipped. 
+    
+    Must be sent to a thread if working with an asyncio loop. """
+
+    contents = []
+    
+    try:
+        with scandir(join(PATH, "guild_data")) as entries:
+            files = [join(entry.path, file_name) for entry in entries if entry.is_dir()]
+    except OSError as e:
+        log(f"An error occurred while scanning guild data\nErr: {e}")
+        return contents
+    
+    for file in files:
+        if not isfile(file):
+            continue
+
+        content = read_file_json(file, can_log=CAN_LOG, logger=LOGGER)
+        if isinstance(content, dict):
+            contents.append(content)
+
+    return contents
+
 async def write_guild_json(
         interaction: Interaction,
         content: dict,
@@ -185,6 +214,20 @@ def update_guild_states(guild_states: dict[str, Any], interaction: Interaction,
         for state, value in zip(states, values):
             update_guild_state(guild_states, interaction, value, state)
 
+def get_playback_position(guild_states: dict[str, Any], interaction: Interaction) -> float:
+    """ Return the playback position of the current track in seconds.
+
+    Read from the frames delivered by the current audio source (see `PositionTrackingSource`) if available,
+    otherwise estimated from the `start_time` and `elapsed_time` guild states. """
+
+    state = guild_states[interaction.guild.id]
+    audio_source = state["audio_source"]
+
+    if isinstance(audio_source, PositionTrackingSource):
+        return audio_source.position
+
+    return monotonic() - state["start_time"] if state["voice_client"].is_playing() else state["elapsed_time"]
+
 # Function to reset states
 def get_default_state(voice_client: discord.VoiceClient, current_text_channel: discord.TextChannel, starter_user: discord.User | discord.Member) -> dict[str, Any]:
     """ Return a hashmap of default guild states. 
@@ -203,6 +246,7 @@ def get_default_state(voice_client: discord.VoiceClient, current_text_channel: d
         "is_modifying": False,
         "is_extracting": False,
         "can_extract": False,
+        "extraction_tasks": set(),
         "allow_greetings": True,
         "allow_voice_status_edit": True,
         "is_editing_filters": False,
@@ -216,6 +260,7 @@ def get_default_state(voice_client: discord.VoiceClient, current_text_channel: d
         "first_track_start_date": None,
         "elapsed_time": 0,
         "start_time": 0,
+        "audio_source": None,
         "queue": [],
         "queue_history": [],
         "queue_to_loop": [],
@@ -223,6 +268,8 @@ def get_default_state(voice_client: discord.VoiceClient, current_text_channel: d
         "filters": {},
         "crash_recovery_count": 0,
         "last_recovery_time": 0,
+        "prefetch_task": None,
+        "prefetched_track": None,
         "pending_cleanup": False,
         "handling_disconnect_action": False,
         "handling_move_action": False,
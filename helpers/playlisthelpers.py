@@ -1,6 +1,7 @@
 """ Playlist helpers for discord.py bot """
 
-from typing import Any
+from typing import Any, Callable
+from collections import Counter
 
 # Playlist helpers
 def playlist_exists(content: dict[str, list], playlist_name: str) -> bool:
@@ -44,3 +45,38 @@ def has_playlists(content: dict[str, list]) -> bool:
     Return a boolean. """
 
     return len(content) > 0
+
+def rank_saved_tracks(contents: list[dict[str, list]], key: Callable[[str], str] | None=None) -> list[dict[str, Any]]:
+    """ Rank the tracks saved across multiple JSON playlist structures (e.g. one per guild) by the amount of structures they appear in,
+    then by their total amount of appearances.
+
+    Tracks are matched by their `webpage_url`, passed through `key` if given. Malformed tracks are ignored.
+
+    Return one saved track per match, most popular first. """
+
+    structure_counts = Counter()
+    total_counts = Counter()
+    tracks = {}
+
+    for content in contents:
+        seen = set()
+
+        for playlist in content.values():
+            if not isinstance(playlist, list):
+                continue
+
+            for track in playlist:
+                if not isinstance(track, dict) or not isinstance(track.get("webpage_url"), str):
+                    continue
+
+                identity = key(track["webpage_url"]) if key is not None else track["webpage_url"]
+                tracks.setdefault(identity, track)
+                total_counts[identity] += 1
+
+                if identity not in seen:
+                    seen.add(identity)
+                    structure_counts[identity] += 1
+
+    ranking = sorted(tracks, key=lambda identity: (structure_counts[identity], total_counts[identity]), reverse=True)
+
+    return [tracks[identity] for identity in ranking]
@@ -3,7 +3,7 @@
 from settings import MAX_ITEM_NAME_LENGTH
 from init.constants import RAW_FILTER_TO_VISUAL_TEXT, NEED_TIME_FORMATTING_TO_MINUTES_FILTERS, MAX_SKIP_AMOUNT
 from error import Error
-from webextractor import SourceWebsite, SourceWebsiteValue, SearchWebsiteIDValue, YOUTUBE_DOMAINS, SOUNDCLOUD_DOMAINS, BANDCAMP_DOMAINS
+from webextractor import SourceWebsite, SourceWebsiteValue, SearchWebsiteIDValue, YOUTUBE_DOMAINS, SOUNDCLOUD_DOMAINS, BANDCAMP_DOMAINS, Track, canonicalize_url
 from helpers.timehelpers import format_to_seconds, format_to_minutes
 from helpers.extractorhelpers import fetch_query
 
@@ -19,7 +19,7 @@ def get_pages(items: list[Any]) -> list[list[Any]]:
     return [items[i:i+25] for i in range(0, len(items), 25)]
 
 # Functions to update the copied queue when /queueloop is enabled.
-def update_loop_queue_replace(guild_states: dict[str, Any], interaction: Interaction, old_track: dict[str, Any], track: dict[str, Any]) -> None:
+def update_loop_queue_replace(guild_states: dict[str, Any], interaction: Interaction, old_track: Track, track: Track) -> None:
     """ Update the queue to loop by replacing an old track with the new one.
 
     This function must be called after replacing an item from the queue and `is_looping_queue` state is active. """
@@ -36,7 +36,7 @@ def update_loop_queue_replace(guild_states: dict[str, Any], interaction: Interac
             queue_to_loop.pop(loop_index)
             queue_to_loop.insert(loop_index, track)
 
-def update_loop_queue_remove(guild_states: dict[str, Any], interaction: Interaction, tracks_to_remove: list[dict[str, Any]]) -> None:
+def update_loop_queue_remove(guild_states: dict[str, Any], interaction: Interaction, tracks_to_remove: list[Track]) -> None:
     """ Update the queue to loop by removing items that are not in the queue.
 
     This function must be called after removing items from the queue and `is_looping_queue` state is active. """
@@ -53,7 +53,7 @@ def update_loop_queue_remove(guild_states: dict[str, Any], interaction: Interact
 
                     break
 
-def update_loop_queue_add(guild_states: dict[str, Any], interaction: Interaction, added: list[dict[str, Any]]) -> None:
+def update_loop_queue_add(guild_states: dict[str, Any], interaction: Interaction, added: list[Track]) -> None:
     """ Update the queue to loop with the latest extracted items from a queue.
 
     This function must be called after new tracks have been added to the queue and the `is_looping_queue` state is active. """
@@ -144,7 +144,7 @@ def find_track(track: str, iterable: list[dict[str, Any]], by_index: bool=False)
         
     return Error(f"Could not find track **{track[:MAX_ITEM_NAME_LENGTH]}**.")
 
-def get_previous_visual_track(current: dict[str, Any] | None, history: list[dict[str, Any]] | list) -> dict[str, Any] | Error:
+def get_previous_visual_track(current: Track | None, history: list[Track] | list) -> Track | Error:
     """ Return the previous track in a history of tracks based on the current track.
 
     Do not remove the returned track. """
@@ -163,11 +163,11 @@ def get_previous_visual_track(current: dict[str, Any] | None, history: list[dict
 def get_next_visual_track(
         is_random: bool, 
         is_looping: bool, 
-        track_to_loop: dict[str, Any] | None, 
+        track_to_loop: Track | None, 
         filters: dict[str, Any] | None, 
-        queue: list[dict[str, Any]], 
-        queue_to_loop: list[dict[str, Any]]
-    ) -> dict[str, Any] | Error:
+        queue: list[Track], 
+        queue_to_loop: list[Track]
+    ) -> Track | Error:
     """ Get the next track based on different states.
 
     Do not remove the returned track from the queue. """
@@ -193,10 +193,10 @@ def get_next_visual_track(
 def get_next_track(
         is_random: bool, 
         is_looping: bool, 
-        track_to_loop: dict[str, Any] | None, 
+        track_to_loop: Track | None, 
         filters: dict[str, Any] | None, 
-        queue: list[dict[str, Any]]
-    ) -> dict[str, Any]:
+        queue: list[Track]
+    ) -> Track:
     """ Get the next track based on different states.
 
     Priority:
@@ -219,6 +219,34 @@ def get_next_track(
     
     return next_track
 
+def peek_next_track(
+        is_random: bool, 
+        is_looping: bool, 
+        track_to_loop: Track | None, 
+        filters: dict[str, Any] | None, 
+        queue: list[Track],
+        queue_to_loop: list[Track]
+    ) -> Track | None:
+    """ Predict the track `get_next_track()` will return, following the same priority.
+
+    Return None if the next track cannot be predicted (random selection) or there's no next track.
+
+    Do not remove the returned track from the queue. """
+
+    if is_looping and track_to_loop:
+        return track_to_loop
+    
+    queue = queue or queue_to_loop # play_next() refills an empty queue with the queue to loop
+    if not queue:
+        return None
+
+    if filters:
+        for track in queue:
+            if match_filters(track, filters):
+                return track
+    
+    return queue[0] if not is_random else None
+
 def try_index(iterable: list[Any], index: int, expected: Any=None) -> bool | Any:
     """ Test an index and see if it contains anything.
 
@@ -312,7 +340,7 @@ def match_website_filter(filter_website: SourceWebsiteValue, track_website: Sour
         case _:
             return filter_website == track_website
 
-def match_filters(track: dict[str, Any], filters: dict[str, Any]) -> bool:
+def match_filters(track: Track, filters: dict[str, Any]) -> bool:
     """ Match given filters to a track. 
     
     Possible matches are: Uploader, Duration and Website """
@@ -337,7 +365,7 @@ def match_filters(track: dict[str, Any], filters: dict[str, Any]) -> bool:
 
     return True
 
-def find_next_filtered_track(queue: list[dict[str, Any]], filters: dict[str, Any], is_random: bool) -> dict[str, Any]:
+def find_next_filtered_track(queue: list[Track], filters: dict[str, Any], is_random: bool) -> Track:
     """ Find the next track in a queue with the given filters. 
     
     Return the matching track or the next one if no filters match. """
@@ -375,14 +403,17 @@ def get_random_tracks_from_queue(queue: list[dict[str, Any]], amount: int) -> li
 
     return sample(queue, amount)
 
-def replace_data_with_playlist_data(tracks: list[dict[str, Any]], playlist_tracks: list[dict[str, Any]]) -> None:
+def replace_data_with_playlist_data(tracks: list[Track], playlist_tracks: list[dict[str, Any]]) -> None:
     """ Directly replace a track's 'title' and 'source_website' keys' values with values from matching playlist tracks. """
 
     seen = set()
+    found_identities = [canonicalize_url(found["webpage_url"]) for found in tracks]
 
     for i, orig in enumerate(playlist_tracks):
-        for found in tracks:
-            if orig["webpage_url"] == found["webpage_url"] and i not in seen:
+        orig_identity = canonicalize_url(orig["webpage_url"])
+
+        for found, found_identity in zip(tracks, found_identities):
+            if orig_identity == found_identity and i not in seen:
                 found["title"] = orig["title"]
                 found["source_website"] = orig["source_website"]
 
@@ -472,7 +503,7 @@ async def replace_track_in_queue(
     if isinstance(extracted_track, Error):
         return extracted_track
 
-    if extracted_track["webpage_url"] == track_to_replace["webpage_url"]:
+    if canonicalize_url(extracted_track["webpage_url"]) == canonicalize_url(track_to_replace["webpage_url"]):
         return Error(f"Cannot replace a track (**{track_to_replace['title'][:MAX_ITEM_NAME_LENGTH]}**) with the same one.")
 
     orig_track = extracted_track
@@ -566,7 +597,7 @@ def place_track_in_queue(queue: list, index: int | None, track: dict[str, Any],
 
     return orig_track, index
 
-def skip_tracks_in_queue(queue: list[dict[str, Any]], current_track: dict[str, Any], is_looping: bool, amount: int=1) -> list[dict[str, Any]] | Error:
+def skip_tracks_in_queue(queue: list[Track], current_track: Track, is_looping: bool, amount: int=1) -> list[Track] | Error:
     """ Skip a specified amount of tracks in a queue. 
     
     This function directly modifies the queue. """
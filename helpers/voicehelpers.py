@@ -5,7 +5,7 @@ from init.constants import GREET_TIMEOUT_SECONDS, MAX_USER_WAIT_TIME_AFTER_CHANN
 from bot import Bot, ShardedBot
 from helpers.lockhelpers import get_vc_lock
 from helpers.cachehelpers import invalidate_cache
-from helpers.guildhelpers import update_guild_state, update_guild_states
+from helpers.guildhelpers import update_guild_state, update_guild_states, get_playback_position
 from init.logutils import log, separator
 
 import asyncio
@@ -47,6 +47,17 @@ def cleanup_guilds(guild_states: dict[str, Any], clients: list[discord.VoiceClie
 
     for guild_id in guild_states.copy():
         if guild_id not in active_guild_ids:
+            prefetch_task = guild_states[guild_id].get("prefetch_task")
+            if prefetch_task is not None:
+                prefetch_task.cancel()
+
+            prefetched = guild_states[guild_id].get("prefetched_track")
+            if prefetched is not None and prefetched[2] is not None:
+                prefetched[2].cleanup() # Kill the unused FFmpeg process
+
+            for extraction_task in guild_states[guild_id].get("extraction_tasks", ()):
+                extraction_task.cancel()
+
             invalidate_cache(guild_id, guild_states)
             invalidate_cache(guild_id, PLAYLIST_LOCKS)
             invalidate_cache(guild_id, ROLE_LOCKS)
@@ -194,8 +205,6 @@ async def handle_channel_move(
     text_channel = guild_states[member.guild.id]["interaction_channel"]
     can_update_status = guild_states[member.guild.id]["allow_voice_status_edit"]
     current_status = guild_states[member.guild.id]["voice_status"]
-    start_time = guild_states[member.guild.id]["start_time"]
-    elapsed_time = guild_states[member.guild.id]["elapsed_time"]
 
     if handling_move_action:
         log(f"[GUILDSTATE][SHARD ID {member.guild.shard_id}] Already handling a move action for channel ID {after_state.channel.id}")
@@ -217,8 +226,8 @@ async def handle_channel_move(
 
     if len(voice_client.channel.members) < 2:
         if voice_client.is_playing():
+            elapsed_time = int(get_playback_position(guild_states, member))
             voice_client.pause()
-            elapsed_time = int(monotonic() - start_time)
             update_guild_state(guild_states, member, elapsed_time, "elapsed_time")
 
         await text_channel.send(f"Waiting **{MAX_USER_WAIT_TIME_AFTER_CHANNEL_MOVE}** seconds for users in new channel **{voice_client.channel.name}**.")
@@ -232,7 +241,7 @@ async def handle_channel_move(
 
         if voice_client.is_paused():
             voice_client.resume()
-            start_time = int(monotonic() - elapsed_time)
+            start_time = int(monotonic() - guild_states[member.guild.id]["elapsed_time"])
             update_guild_state(guild_states, member, start_time, "start_time")
 
             if can_update_status and current_status:
@@ -7,6 +7,8 @@ from logging import INFO, DEBUG, ERROR, WARNING, CRITICAL
 VALID_LOG_LEVELS = {"normal": INFO, "verbose": DEBUG, "errors": ERROR, "warnings": WARNING, "critical": CRITICAL}
 VALID_ACTIVITY_TYPES = {"playing": discord.ActivityType.playing, "watching": discord.ActivityType.watching, "listening": discord.ActivityType.listening}
 VALID_STATUSES = {"online": discord.Status.online, "idle": discord.Status.idle, "do_not_disturb": discord.Status.do_not_disturb, "invisible": discord.Status.invisible}
+VALID_EXTRACTOR_BACKENDS = ("thread", "process")
+VALID_PLAYBACK_MODES = ("pcm", "opus")
 
 # Moderation stuff
 MAX_CHANNEL_NAME_LENGTH = 100
@@ -28,10 +30,19 @@ MAX_GUILD_CLEANUP_WAIT_TIME = 10
 GREET_TIMEOUT_SECONDS = 10
 PLAYBACK_END_GRACE_PERIOD = 1
 MAX_STREAM_REFRESH_RETRY_COUNT = 2
+MAX_PREFETCHED_TRACK_AGE = 60 # Prefetched streams validated longer ago than this are checked again before playback
+PREBUFFER_FRAMES = 50 # 20ms frames read ahead from the next track's audio source before it plays
 MAX_RETRY_COUNT = 3
 CRASH_RECOVERY_TIME_WINDOW = 10
 FFMPEG_RECONNECT_TIMEOUT_SECONDS = 10
 FFMPEG_READ_WRITE_TIMEOUT_MICROSECONDS = 7000000
+STREAM_BUFFER_CHUNK_SIZE = 65536 # Bytes downloaded per read when buffering a stream
+STREAM_BUFFER_POLL_INTERVAL_SECONDS = 0.1
+STREAM_BUFFER_READ_TIMEOUT_SECONDS = 10 # A buffered stream connection idle for longer is resumed
+MAX_STREAM_BUFFER_RESUME_COUNT = 5 # Consecutive resume attempts without receiving data before a buffered stream ends
+STREAM_BUFFER_RESUME_DELAY_SECONDS = 1
+DEFAULT_STREAM_BUFFER_SIZE = 1048576 # Bytes, used for streams buffered only to fill the audio cache
+MAX_STREAM_BUFFER_CONNECTIONS = 100 # Buffered streams (playing and prefetched tracks) downloading at once, apart from other HTTP requests
 
 # HTTP ClientSession stuff
 HTTP_CLIENT_SESSION_TIMEOUT = 5
@@ -50,7 +61,41 @@ NEKOS_MOE_IMAGE = NEKOS_MOE_BASE_URL + "/image"
 # Bot config stuff
 MAX_IO_SYNC_WAIT_TIME = 20
 MAX_GUILD_COUNT_BEFORE_SHARDING_REQUIRED = 2500
-MAX_FETCH_CALLS = 50
+MAX_CONCURRENT_QUERY_EXTRACTIONS = 5 # Per fetch_queries() call, still bound by the extractor scheduler's slots
+EXTRACTOR_WAIT_LOG_THRESHOLD_SECONDS = 5 # Extractions waiting longer than this for a slot get logged
+CACHE_WARM_UP_INTERVAL_SECONDS = 2 # Pause between two cache warm-up extractions, keeps upstream requests low
+
+# Stream protocols (as reported by yt-dlp) whose Opus audio can be copied without re-encoding
+OPUS_COPY_PROTOCOLS = ("http", "https")
+OPUS_AUDIO_CACHE_SUFFIX = ".opus" # Audio cache files holding Opus audio, copied as-is when played
+
+# Extractor cache stuff
+DEFAULT_EXTRACTOR_CACHE_TTL = 600 # For stream URLs without a known expiry
+MAX_EXTRACTOR_CACHE_TTL = 21600
+STREAM_URL_EXPIRY_MARGIN = 60 # Stream URLs expiring in less than this many seconds are considered expired
+SEARCH_RESULT_COUNT = 5 # Results fetched (flat) per search query and cached as a set
+SEARCH_RESULTS_CACHE_TTL = 3600
+
+# Failed extractions are cached for a time depending on the failure reason
+NEGATIVE_EXTRACTOR_CACHE_TTLS = {
+    "no_results": 300, # Search or playlist without results
+    "unavailable": 1800, # Removed, private, region-blocked or unsupported content
+    "transient": 30 # Network errors, rate limits and anything else
+}
+# Error message fragments (lowercase) marking content as unavailable rather than a transient failure
+UNAVAILABLE_CONTENT_ERROR_MARKERS = (
+    "video unavailable",
+    "private video",
+    "is private",
+    "not available",
+    "has been removed",
+    "has been terminated",
+    "copyright",
+    "members-only",
+    "unsupported url",
+    "http error 404",
+    "http error 410"
+)
 
 # Filter stuff
 RAW_FILTER_TO_VISUAL_TEXT = {
@@ -65,6 +110,7 @@ NEED_TIME_FORMATTING_TO_MINUTES_FILTERS = ["min_duration", "max_duration"]
 COOLDOWNS = {
     "PING_COMMAND_COOLDOWN": 5.0,
     "HELP_COMMAND_COOLDOWN": 5.0,
+    "EXTRACTOR_STATS_COMMAND_COOLDOWN": 5.0,
     "JOIN_COMMAND_COOLDOWN": 5.0,
     "LEAVE_COMMAND_COOLDOWN": 5.0,
     "ADD_COMMAND_COOLDOWN": 20.0,
@@ -1,16 +1,18 @@
 """ Main script for discord.py bot """
 
-from settings import COMMAND_PREFIX, ACTIVITY, INTENTS, TOKEN, HANDLER, FORMATTER, LOG_LEVEL, USE_SHARDING
 from init.logutils import log, separator
-from bot import Bot, ShardedBot
-
-from discord.errors import PrivilegedIntentsRequired, LoginFailure
 
 def main() -> None:
     """ Main entry point for the program.
     
     Handles construction of the custom `Bot` (or `ShardedBot`) object and running it. """
 
+    # Imported here, as extractor worker processes re-import this module as `__mp_main__` and must not load the settings.
+    from settings import COMMAND_PREFIX, ACTIVITY, INTENTS, TOKEN, HANDLER, FORMATTER, LOG_LEVEL, USE_SHARDING
+    from bot import Bot, ShardedBot
+
+    from discord.errors import PrivilegedIntentsRequired, LoginFailure
+
     bot = Bot(COMMAND_PREFIX, activity=ACTIVITY, intents=INTENTS) if not USE_SHARDING else\
     ShardedBot(COMMAND_PREFIX, activity=ACTIVITY, intents=INTENTS)
     
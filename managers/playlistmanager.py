@@ -313,10 +313,17 @@ class PlaylistManager:
         
         query_names = [track["title"] for track in tracks_to_fetch]
 
-        found = await fetch_queries(guild_states, interaction, tracks_to_fetch, query_names, ignore_errors=ignore_extraction_errors)
+        queue = guild_states[interaction.guild.id]["queue"]
+        found = await fetch_queries(
+            guild_states, 
+            interaction, 
+            tracks_to_fetch, 
+            query_names, 
+            ignore_errors=ignore_extraction_errors, 
+            max_results=max_track_limit - len(queue)
+        )
 
         if isinstance(found, list):
-            queue = guild_states[interaction.guild.id]["queue"]
             is_looping_queue = guild_states[interaction.guild.id]["is_looping_queue"]
 
             replace_data_with_playlist_data(found, tracks_to_fetch)
@@ -358,10 +365,17 @@ class PlaylistManager:
             tracks_to_fetch = tracks
         
         query_names = [track["title"] for track in tracks_to_fetch]
-        found = await fetch_queries(guild_states, interaction, tracks_to_fetch, query_names, ignore_errors=ignore_extraction_errors)
+        queue = guild_states[interaction.guild.id]["queue"]
+        found = await fetch_queries(
+            guild_states, 
+            interaction, 
+            tracks_to_fetch, 
+            query_names, 
+            ignore_errors=ignore_extraction_errors, 
+            max_results=max_track_limit - len(queue)
+        )
 
         if isinstance(found, list):
-            queue = guild_states[interaction.guild.id]["queue"]
             is_looping_queue = guild_states[interaction.guild.id]["is_looping_queue"]
 
             replace_data_with_playlist_data(found, tracks_to_fetch)
@@ -440,7 +454,16 @@ class PlaylistManager:
             if is_content_full(MAX_PLAYLIST_LIMIT, content):
                 return Error(f"Maximum playlist limit of **{MAX_PLAYLIST_LIMIT}** reached! Please delete a playlist to free a slot.")
 
-        found = await fetch_queries(guild_states, interaction, queries, allowed_query_types=allowed_query_types, provider=provider)
+        remaining_slots = MAX_PLAYLIST_TRACK_LIMIT - len(content.get(playlist_name, []))
+        found = await fetch_queries(
+            guild_states, 
+            interaction, 
+            queries, 
+            allowed_query_types=allowed_query_types, 
+            provider=provider, 
+            max_results=remaining_slots, 
+            metadata_only=True # Only the playlist track keys are stored
+        )
 
         if isinstance(found, list):
             return await self.add_queue(interaction, content, playlist_name, found, write_to_file)
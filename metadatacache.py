@@ -0,0 +1,85 @@
+""" Persistent metadata cache module for discord.py bot.
+
+Stores stable track metadata (title, uploader, duration, webpage URL, upload date) in an SQLite database so it survives restarts.
+Stream URLs are never stored here, as they expire. """
+
+from init.logutils import log, log_to_discord_log
+
+import sqlite3
+from logging import Logger
+from json import dumps, loads
+from os import makedirs
+from os.path import dirname
+from threading import Lock
+from time import time
+from typing import Any
+
+class MetadataCache:
+    """ Thread-safe SQLite key-value store for JSON-serializable metadata with a fixed TTL.
+
+    Every method may block on disk I/O and must be sent to a thread if working with an asyncio loop.
+
+    Database errors are logged and treated as cache misses. """
+
+    def __init__(self, path: str, ttl: int, can_log: bool=False, logger: Logger | None=None):
+        self.path = path
+        self.ttl = ttl
+        self.can_log = can_log
+        self.logger = logger
+
+        self._lock = Lock()
+
+        makedirs(dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _handle_error(self, error: Exception) -> None:
+        log(f"An error occurred while accessing metadata cache {self.path}\nErr: {error}")
+        log_to_discord_log(error, can_log=self.can_log, logger=self.logger)
+
+    def get(self, key: str) -> Any | None:
+        """ Return the metadata stored under `key` or None if missing or expired. """
+
+        try:
+            with self._lock:
+                row = self._connection.execute("SELECT value, expires_at FROM metadata WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return None
+
+        if row is None or row[1] < time():
+            return None
+
+        return loads(row[0])
+
+    def store(self, key: str, value: Any) -> None:
+        """ Store JSON-serializable `value` under `key`, replacing any previous value. """
+
+        if not value:
+            return
+
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO metadata (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, dumps(value), time() + self.ttl)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._handle_error(e)
+
+    def purge_expired(self) -> int:
+        """ Delete every expired entry. Return the amount of deleted entries. """
+
+        try:
+            with self._lock, self._connection:
+                return self._connection.execute("DELETE FROM metadata WHERE expires_at < ?", (time(),)).rowcount
+        except sqlite3.Error as e:
+            self._handle_error(e)
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -8,7 +8,7 @@ from init.logutils import log, separator, log_to_discord_log
 from helpers.timehelpers import format_to_minutes, format_to_seconds
 from helpers.guildhelpers import (
     check_guild_state, check_channel, user_has_role, update_guild_state, update_guild_states, update_query_extraction_state,
-    get_default_state
+    get_default_state, get_playback_position
 )
 from helpers.queuehelpers import (
     check_input_length, check_queue_length,
@@ -20,19 +20,20 @@ from helpers.queuehelpers import (
 from helpers.voicehelpers import (
     set_voice_status, close_voice_clients, check_users_in_channel
 )
-from helpers.extractorhelpers import fetch_query, fetch_queries, add_results_to_queue
+from helpers.extractorhelpers import fetch_query, stream_queries, stop_extractions, add_results_to_queue
 from helpers.embedhelpers import (
     generate_added_track_embed, generate_current_track_embed, generate_epoch_embed, generate_extraction_progress_embed, generate_generic_track_embed,
     generate_queue_page_embed, generate_removed_tracks_embed, generate_skipped_tracks_embed,
 )
 from error import Error
-from webextractor import SourceWebsite, SearchWebsiteID
+from webextractor import SourceWebsite, SearchWebsiteID, Track
 from audioplayer import AudioPlayer
 from bot import Bot, ShardedBot
 
 import discord
 from time import monotonic, time as get_unix_timestamp
 from copy import deepcopy
+from contextlib import aclosing
 from random import randint, shuffle
 from discord import app_commands
 from discord.interactions import Interaction
@@ -135,29 +136,47 @@ class MusicCog(commands.Cog):
         )
         provider = search_provider.value if search_provider else SearchWebsiteID.YOUTUBE_SEARCH.value
 
-        found = await fetch_queries(self.guild_states, interaction, queries_split, allowed_query_types=allowed_query_types, provider=provider)
+        added = []
+        error = None
 
-        update_guild_state(self.guild_states, interaction, False, "is_extracting")
-        update_query_extraction_state(self.guild_states, interaction, 0, 0, None, None)
+        # Tracks are queued as soon as they're extracted, so playback starts with the first one.
+        results = stream_queries(
+            self.guild_states, 
+            interaction, 
+            queries_split, 
+            allowed_query_types=allowed_query_types, 
+            provider=provider, 
+            max_results=MAX_QUEUE_TRACK_LIMIT - len(queue) # Never extract tracks that can't fit in the queue
+        )
+        
+        async with aclosing(results):
+            async for result in results:
+                if isinstance(result, Error):
+                    error = result
+                    break
 
-        if isinstance(found, Error):
-            update_guild_state(self.guild_states, interaction, False, "is_modifying")
-            await interaction.followup.send(found.msg)
-        elif isinstance(found, list):
-            added = await add_results_to_queue(interaction, found, queue, MAX_QUEUE_TRACK_LIMIT)
-            
-            if is_looping_queue:
-                update_loop_queue_add(self.guild_states, interaction, added)
+                new_tracks = await add_results_to_queue(interaction, [result], queue, MAX_QUEUE_TRACK_LIMIT)
+                if not new_tracks:
+                    break
 
-            if not voice_client.is_playing() and\
-                not voice_client.is_paused():
-                await self.player.play_next(interaction)
-            
-            embed = generate_added_track_embed(added)
+                added.extend(new_tracks)
+                if is_looping_queue:
+                    update_loop_queue_add(self.guild_states, interaction, new_tracks)
 
-            update_guild_state(self.guild_states, interaction, False, "is_modifying")
+                if not voice_client.is_playing() and\
+                    not voice_client.is_paused():
+                    await self.player.play_next(interaction)
 
-            await interaction.followup.send(embed=embed)
+        update_guild_states(self.guild_states, interaction, (False, False), ("is_extracting", "is_modifying"))
+        update_query_extraction_state(self.guild_states, interaction, 0, 0, None, None)
+
+        if added:
+            await interaction.followup.send(embed=generate_added_track_embed(added))
+        
+        if error is not None:
+            await interaction.followup.send(error.msg)
+        elif not added:
+            await interaction.followup.send("Could not extract any track.")
 
     @add_track.error
     async def handle_add_track_error(self, interaction: Interaction, error: Exception):
@@ -223,7 +242,7 @@ class MusicCog(commands.Cog):
         update_guild_state(self.guild_states, interaction, False, "is_extracting")
         update_query_extraction_state(self.guild_states, interaction, 0, 0, None, None)
 
-        if isinstance(extracted_track, dict):
+        if isinstance(extracted_track, Track):
             if current_track is not None and keep_current_track:
                 queue.insert(0, current_track)
                 update_guild_state(self.guild_states, interaction, False, "is_modifying")
@@ -380,7 +399,6 @@ class MusicCog(commands.Cog):
         voice_client = self.guild_states[interaction.guild.id]["voice_client"]
         current_track = self.guild_states[interaction.guild.id]["current_track"]
         can_update_status = self.guild_states[interaction.guild.id]["allow_voice_status_edit"]
-        start_time = self.guild_states[interaction.guild.id]["start_time"]
 
         if voice_client.is_paused():
             update_guild_state(self.guild_states, interaction, False, "voice_client_locked")
@@ -388,9 +406,10 @@ class MusicCog(commands.Cog):
             await interaction.followup.send("I'm already paused!")
             return
 
+        elapsed_time = int(get_playback_position(self.guild_states, interaction))
         voice_client.pause()
 
-        update_guild_state(self.guild_states, interaction, int(monotonic() - start_time), "elapsed_time")
+        update_guild_state(self.guild_states, interaction, elapsed_time, "elapsed_time")
 
         if can_update_status:
             update_guild_state(self.guild_states, interaction, f"Listening to '{current_track['title']}' (paused)", "voice_status")
@@ -1054,16 +1073,8 @@ class MusicCog(commands.Cog):
             await interaction.followup.send("Invalid time format. Be sure to format it to **HH:MM:SS**.\n**MM** and **SS** must not be > **59**.")
             return
         
-        start_time = self.guild_states[interaction.guild.id]["start_time"]
-        if not voice_client.is_paused():
-            update_guild_state(
-                self.guild_states,
-                interaction,
-                min(int(monotonic() - start_time), format_to_seconds(current_track["duration"])),
-                "elapsed_time"
-            )
-        
-        position = self.guild_states[interaction.guild.id]["elapsed_time"] - time_in_seconds
+        elapsed_time = min(int(get_playback_position(self.guild_states, interaction)), format_to_seconds(current_track["duration"]))
+        position = elapsed_time - time_in_seconds
 
         update_guild_state(self.guild_states, interaction, True, "stop_flag")        
         await self.player.play_track(interaction, voice_client, current_track, position, "rewind")
@@ -1113,16 +1124,8 @@ class MusicCog(commands.Cog):
             await interaction.followup.send("Invalid time format. Be sure to format it to **HH:MM:SS**.\n**MM** and **SS** must not be > **59**.")
             return
         
-        start_time = self.guild_states[interaction.guild.id]["start_time"]
-        if not voice_client.is_paused():
-            update_guild_state(
-                self.guild_states,
-                interaction,
-                min(int(monotonic() - start_time), format_to_seconds(current_track["duration"])),
-                "elapsed_time"
-            )
-
-        position = self.guild_states[interaction.guild.id]["elapsed_time"] + time_in_seconds
+        elapsed_time = min(int(get_playback_position(self.guild_states, interaction)), format_to_seconds(current_track["duration"]))
+        position = elapsed_time + time_in_seconds
 
         update_guild_state(self.guild_states, interaction, True, "stop_flag")
         await self.player.play_track(interaction, voice_client, current_track, position, "forward")
@@ -1250,7 +1253,7 @@ class MusicCog(commands.Cog):
         
         await interaction.response.defer(thinking=True)
 
-        update_guild_state(self.guild_states, interaction, False, "can_extract")
+        stop_extractions(self.guild_states, interaction)
 
         await interaction.followup.send("Successfully completed request. Extraction process should stop shortly.")
 
@@ -1486,11 +1489,8 @@ class MusicCog(commands.Cog):
         track_to_loop = self.guild_states[interaction.guild.id]["track_to_loop"]
         queue_state_being_modified = self.guild_states[interaction.guild.id]["is_modifying"]
         
-        if voice_client.is_playing():
-            fixed_elapsed_time = min(int(monotonic() - self.guild_states[interaction.guild.id]["start_time"]), format_to_seconds(info["duration"]))
-            elapsed_time = format_to_minutes(fixed_elapsed_time)
-        else:
-            elapsed_time = format_to_minutes(int(self.guild_states[interaction.guild.id]["elapsed_time"]))
+        fixed_elapsed_time = min(int(get_playback_position(self.guild_states, interaction)), format_to_seconds(info["duration"]))
+        elapsed_time = format_to_minutes(fixed_elapsed_time)
         
         is_looping = self.guild_states[interaction.guild.id]["is_looping"]
         is_random = self.guild_states[interaction.guild.id]["is_random"]
@@ -1,9 +1,10 @@
 """ Utilities module for discord.py bot. """
 
-from settings import HELP, CAN_LOG, LOGGER
+from settings import HELP, CAN_LOG, LOGGER, EXTRACTOR_METRICS
 from init.constants import COOLDOWNS
 from bot import Bot, ShardedBot
-from helpers.embedhelpers import generate_ping_embed
+from helpers.embedhelpers import generate_ping_embed, generate_extractor_stats_embed
+from helpers.extractorhelpers import EXTRACTOR_SCHEDULER
 from init.logutils import log_to_discord_log
 
 from discord import app_commands
@@ -74,3 +75,30 @@ class UtilsCog(commands.Cog):
         log_to_discord_log(error, can_log=CAN_LOG, logger=LOGGER)
 
         await interaction.response.send_message("An unknown error occurred.", ephemeral=True)
+
+    @app_commands.command(name="extractor-stats", description="Shows extractor metrics per source website. Bot owner only.")
+    @app_commands.checks.cooldown(rate=1, per=COOLDOWNS["EXTRACTOR_STATS_COMMAND_COOLDOWN"], key=lambda i: i.user.id)
+    async def show_extractor_stats(self, interaction: Interaction):
+        if not await self.client.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+            return
+        
+        summary = EXTRACTOR_METRICS.get_summary()
+        if summary is None:
+            await interaction.response.send_message("Extractor metrics are disabled.", ephemeral=True)
+            return
+        
+        embed = generate_extractor_stats_embed(summary, EXTRACTOR_SCHEDULER.get_wait_stats())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @show_extractor_stats.error
+    async def handle_show_extractor_stats_error(self, interaction: Interaction, error):
+        if isinstance(error, app_commands.CommandOnCooldown):
+            await interaction.response.send_message(str(error), ephemeral=True)
+            return
+        
+        send_func = interaction.response.send_message if not interaction.response.is_done() else interaction.followup.send
+
+        log_to_discord_log(error, can_log=CAN_LOG, logger=LOGGER)
+
+        await send_func("An unknown error occurred.", ephemeral=True)
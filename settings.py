@@ -5,20 +5,25 @@ from init.help import open_help_file
 from init.config import get_config_data
 from init.logsetup import set_up_logging, remove_log
 from init.logutils import log, separator
-from init.constants import MAX_FETCH_CALLS, VALID_LOG_LEVELS
-from helpers.confighelpers import ConfigCategory, get_config_value, correct_type, get_default_yt_dlp_config_data
+from init.constants import VALID_LOG_LEVELS, VALID_EXTRACTOR_BACKENDS, VALID_PLAYBACK_MODES, SEARCH_RESULTS_CACHE_TTL
+from helpers.cachehelpers import get_extractor_cache_ttu, get_negative_extractor_cache_ttu
+from helpers.confighelpers import ConfigCategory, get_config_value, correct_type, correct_value_in, get_default_yt_dlp_config_data
+from extractorworker import ExtractorProcessPool
+from ydlpool import YoutubeDLPool
+from metadatacache import MetadataCache
+from audiocache import AudioCache
+from extractormetrics import MetricsSink, InMemoryMetricsSink
 
 import asyncio
 import discord
 from discord import Intents
-from cachetools import TTLCache
-from yt_dlp import YoutubeDL
+from cachetools import TTLCache, TLRUCache
 from types import NoneType
 from logging import INFO
 from os import getenv
-from os.path import dirname
+from os.path import dirname, join
 from sys import exit as sysexit
-from time import sleep
+from time import sleep, time
 from shutil import which
 from dotenv import load_dotenv
 
@@ -54,6 +59,21 @@ USE_SHARDING = correct_type(get_config_value(CONFIG, "use_sharding", ConfigCateg
 ENABLE_FILE_BACKUPS = correct_type(get_config_value(CONFIG, "enable_file_backups", ConfigCategory.OTHER.value), bool, True)
 CAN_AUTO_DELETE_GUILD_DATA = correct_type(get_config_value(CONFIG, "auto_delete_unused_guild_data", ConfigCategory.OTHER.value), bool, True)
 _USER_FFMPEG_EXEC = correct_type(get_config_value(CONFIG, "ffmpeg_bin", ConfigCategory.OTHER.value), (NoneType, str), None)
+EXTRACTOR_BACKEND = correct_value_in(get_config_value(CONFIG, "extractor_backend", ConfigCategory.OTHER.value), VALID_EXTRACTOR_BACKENDS, "thread")
+PLAYBACK_MODE = correct_value_in(get_config_value(CONFIG, "playback_mode", ConfigCategory.OTHER.value), VALID_PLAYBACK_MODES, "opus")
+EXTRACTOR_PROCESS_COUNT = max(1, correct_type(get_config_value(CONFIG, "extractor_process_count", ConfigCategory.OTHER.value), int, 4))
+YDL_POOL_SIZE = max(1, correct_type(get_config_value(CONFIG, "yt_dlp_pool_size", ConfigCategory.OTHER.value), int, 16))
+YDL_POOL_MAX_USES = max(1, correct_type(get_config_value(CONFIG, "yt_dlp_pool_max_uses", ConfigCategory.OTHER.value), int, 500))
+ENABLE_METADATA_CACHE = correct_type(get_config_value(CONFIG, "enable_metadata_cache", ConfigCategory.OTHER.value), bool, True)
+METADATA_CACHE_TTL = correct_type(get_config_value(CONFIG, "metadata_cache_ttl", ConfigCategory.OTHER.value), int, 604800)
+LAZY_PLAYLIST_EXTRACTION = correct_type(get_config_value(CONFIG, "lazy_playlist_extraction", ConfigCategory.OTHER.value), bool, True)
+PREFETCH_SECONDS = max(0, correct_type(get_config_value(CONFIG, "prefetch_seconds", ConfigCategory.OTHER.value), int, 10))
+EXTRACTION_TIMEOUT = max(1, correct_type(get_config_value(CONFIG, "extraction_timeout", ConfigCategory.OTHER.value), int, 120))
+ENABLE_NATIVE_EXTRACTORS = correct_type(get_config_value(CONFIG, "enable_native_extractors", ConfigCategory.OTHER.value), bool, True)
+CACHE_WARM_UP_TRACK_COUNT = max(0, correct_type(get_config_value(CONFIG, "cache_warm_up_track_count", ConfigCategory.OTHER.value), int, 0))
+ENABLE_EXTRACTOR_METRICS = correct_type(get_config_value(CONFIG, "enable_extractor_metrics", ConfigCategory.OTHER.value), bool, True)
+STREAM_BUFFER_SIZE = max(0, correct_type(get_config_value(CONFIG, "stream_buffer_size_kb", ConfigCategory.OTHER.value), int, 0)) * 1024
+AUDIO_CACHE_SIZE = max(0, correct_type(get_config_value(CONFIG, "audio_cache_size_mb", ConfigCategory.OTHER.value), int, 0)) * 1024 * 1024
 
 MAX_QUEUE_TRACK_LIMIT = correct_type(get_config_value(CONFIG, "max_queue_track_limit", ConfigCategory.LIMITS.value), int, 100)
 MAX_TRACK_HISTORY_LIMIT = correct_type(get_config_value(CONFIG, "max_history_track_limit", ConfigCategory.LIMITS.value), int, 200)
@@ -78,21 +98,42 @@ if not check_ffmpeg_path_output(OS_NAME, FFMPEG_EXEC, _USER_FFMPEG_EXEC):
 # Set up hashmaps for asyncio locks and cache
 PLAYLIST_LOCKS = {}
 ROLE_LOCKS = {}
+EXTRACTOR_IN_FLIGHT = {} # Extractions currently running and their slot requests, keyed by cache key
 ROLE_FILE_CACHE = TTLCache(maxsize=16384, ttl=3600)
 PLAYLIST_FILE_CACHE = TTLCache(maxsize=16384, ttl=3600)
-EXTRACTOR_CACHE = TTLCache(maxsize=16384, ttl=600)
+EXTRACTOR_CACHE = TLRUCache(maxsize=16384, ttu=get_extractor_cache_ttu, timer=time) # Per-entry TTL based on stream URL expiry
+NEGATIVE_EXTRACTOR_CACHE = TLRUCache(maxsize=8192, ttu=get_negative_extractor_cache_ttu, timer=time) # Failed extractions, per-reason TTL
+SEARCH_RESULTS_CACHE = TTLCache(maxsize=4096, ttl=SEARCH_RESULTS_CACHE_TTL) # Top search results (no stream URLs), keyed by normalized query
 NEKOS_MOE_CACHE = TTLCache(maxsize=8192, ttl=3600)
 
-# Set up YoutubeDL instance
-YDL = YoutubeDL(YDL_OPTIONS)
+# Extractor metrics sink. Replace InMemoryMetricsSink with another MetricsSink subclass to send metrics elsewhere.
+EXTRACTOR_METRICS = InMemoryMetricsSink() if ENABLE_EXTRACTOR_METRICS else MetricsSink()
+
+# Persistent extractor metadata cache, stored next to the guild_data directory.
+METADATA_CACHE = MetadataCache(join(PATH, "cache", "metadata.sqlite3"), METADATA_CACHE_TTL, CAN_LOG, LOGGER) if ENABLE_METADATA_CACHE else None
+if METADATA_CACHE is not None:
+    log(f"Metadata cache enabled, purged {METADATA_CACHE.purge_expired()} expired entries")
+    separator()
+
+# On-disk audio cache, filled while buffered streams play.
+AUDIO_CACHE = AudioCache(join(PATH, "cache", "audio"), AUDIO_CACHE_SIZE, CAN_LOG, LOGGER) if AUDIO_CACHE_SIZE > 0 else None
+if AUDIO_CACHE is not None:
+    log(f"Audio cache enabled, {AUDIO_CACHE.size // (1024 * 1024)}/{AUDIO_CACHE_SIZE // (1024 * 1024)} MiB used")
+    separator()
+
+# Set up YoutubeDL pool. Instances are created on demand, up to YDL_POOL_SIZE.
+YDL_POOL = YoutubeDLPool(YDL_OPTIONS, YDL_POOL_SIZE, YDL_POOL_MAX_USES)
+
+# Set up extractor worker processes, if requested. Each worker owns its own YoutubeDL instance.
+# Processes are only spawned on the first extraction.
+EXTRACTOR_PROCESS_POOL = ExtractorProcessPool(EXTRACTOR_PROCESS_COUNT, YDL_OPTIONS, YDL_POOL_MAX_USES) if EXTRACTOR_BACKEND == "process" else None
+log(f"Extractor backend: {EXTRACTOR_BACKEND}{f' ({EXTRACTOR_PROCESS_COUNT} worker processes)' if EXTRACTOR_PROCESS_POOL is not None else ''}")
+separator()
 
 # Global locks
 FILE_OPERATIONS_LOCKED = asyncio.Event()
 VOICE_OPERATIONS_LOCKED = asyncio.Event()
 
-# asyncio Semaphore for extractor
-EXTRACTOR_SEMAPHORE = asyncio.Semaphore(MAX_FETCH_CALLS)
-
 # API stuff
 ACTIVITY_DATA = get_activity_data(CONFIG)
 if not ACTIVITY_DATA["activity_enabled"]:
@@ -0,0 +1,176 @@
+""" Stream buffer module for discord.py bot.
+
+Downloads a remote audio stream into a bounded in-memory buffer that FFmpeg reads from its stdin.
+Network errors are retried with HTTP Range requests, so a dropped connection does not end the FFmpeg process reading the stream.
+The downloaded stream can also be written to the audio cache while it plays. """
+
+from init.constants import (
+    STREAM_BUFFER_CHUNK_SIZE, STREAM_BUFFER_POLL_INTERVAL_SECONDS, STREAM_BUFFER_READ_TIMEOUT_SECONDS,
+    MAX_STREAM_BUFFER_RESUME_COUNT, STREAM_BUFFER_RESUME_DELAY_SECONDS
+)
+from init.logutils import log
+from audiocache import AudioCacheFill
+
+import asyncio
+from aiohttp import ClientSession, ClientTimeout, ClientResponse
+from aiohttp.client_exceptions import ClientError
+from threading import Condition
+
+class StreamBuffer:
+    """ Bounded byte buffer filled from an HTTP(S) stream by an asyncio task and read by a thread (e.g. discord.py's FFmpeg stdin writer).
+
+    `url` and `http_headers`: The stream URL and the headers it must be requested with.
+
+    `capacity`: Maximum amount of bytes held at once. Downloading pauses while the buffer is full.
+
+    `cache_fill`: Audio cache file the whole stream is written to, committed only if the stream is downloaded to its end.
+
+    Call `start()` from the event loop to begin downloading and `close()` (from any thread) once done with it. """
+
+    def __init__(self, url: str, http_headers: dict[str, str] | None, capacity: int, cache_fill: AudioCacheFill | None=None):
+        self.url = url
+        self.http_headers = http_headers or {}
+        self.capacity = max(STREAM_BUFFER_CHUNK_SIZE, capacity)
+        self.cache_fill = cache_fill
+
+        self._buffer = bytearray()
+        self._condition = Condition()
+        self._finished = False
+        self._closed = False
+        self._task = None
+        self._loop = None
+
+    def start(self, session: ClientSession) -> None:
+        """ Start downloading the stream with `session`. Must be called from a running event loop. """
+
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self.fill(session))
+
+    def read(self, size: int=-1) -> bytes:
+        """ Return up to `size` buffered bytes (every buffered byte if negative), waiting for data if the buffer is empty.
+
+        Return empty bytes once the stream is fully read or the buffer is closed. Blocks and must not be called from the event loop. """
+
+        with self._condition:
+            while not self._buffer and not self._finished and not self._closed:
+                self._condition.wait(STREAM_BUFFER_POLL_INTERVAL_SECONDS)
+
+            if self._closed:
+                return b""
+
+            size = len(self._buffer) if size < 0 else size
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+
+            return data
+
+    def close(self) -> None:
+        """ Stop downloading and release buffered data. Safe to call from any thread, more than once. """
+
+        with self._condition:
+            self._closed = True
+            self._buffer.clear()
+            self._condition.notify_all()
+
+        if self._task is not None and not self._task.done():
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError: # Event loop closed
+                pass
+
+    def _write(self, data: bytes) -> None:
+        with self._condition:
+            self._buffer += data
+            self._condition.notify_all()
+
+    def _is_full(self) -> bool:
+        with self._condition:
+            return len(self._buffer) >= self.capacity
+
+    def _finish(self) -> None:
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    async def fill(self, session: ClientSession) -> None:
+        """ Download the stream into the buffer until it ends, resuming from the last received byte with a Range request
+        after a network error, up to `MAX_STREAM_BUFFER_RESUME_COUNT` times in a row.
+
+        The cache fill, if any, is committed once the stream is fully downloaded and aborted otherwise. """
+
+        offset = 0
+        total = None
+        resume_count = 0
+        timeout = ClientTimeout(total=None, sock_read=STREAM_BUFFER_READ_TIMEOUT_SECONDS)
+
+        try:
+            while not self._closed:
+                headers = dict(self.http_headers)
+                if offset > 0:
+                    headers["Range"] = f"bytes={offset}-"
+
+                try:
+                    async with session.get(self.url, headers=headers, timeout=timeout) as response:
+                        if response.status not in (200, 206):
+                            log(f"Stream buffer got HTTP {response.status} at byte {offset}, ending stream.")
+                            return
+
+                        total = get_response_total_size(response, offset) or total
+                        # Servers ignoring the Range header send the stream again from its start.
+                        to_skip = offset if response.status == 200 else 0
+
+                        async for chunk in response.content.iter_chunked(STREAM_BUFFER_CHUNK_SIZE):
+                            if to_skip > 0:
+                                skipped = min(to_skip, len(chunk))
+                                chunk = chunk[skipped:]
+                                to_skip -= skipped
+
+                            if not chunk:
+                                continue
+
+                            while self._is_full() and not self._closed:
+                                await asyncio.sleep(STREAM_BUFFER_POLL_INTERVAL_SECONDS)
+
+                            if self._closed:
+                                return
+
+                            self._write(chunk)
+                            offset += len(chunk)
+                            resume_count = 0
+
+                            if self.cache_fill is not None:
+                                await asyncio.to_thread(self.cache_fill.write, chunk)
+
+                    if total is None or offset >= total:
+                        # Stream of unknown size ended cleanly or fully downloaded
+                        if self.cache_fill is not None:
+                            await asyncio.to_thread(self.cache_fill.commit)
+                        return
+
+                    raise ClientError(f"Connection closed {total - offset} bytes before the end of the stream.")
+                except (ClientError, asyncio.TimeoutError) as e:
+                    if resume_count >= MAX_STREAM_BUFFER_RESUME_COUNT:
+                        log(f"Stream buffer failed to resume at byte {offset} after {resume_count} attempt(s), ending stream. Err: {e}")
+                        return
+
+                    resume_count += 1
+                    log(f"(Try {resume_count}) Stream buffer connection lost at byte {offset}, resuming. Err: {e}")
+                    await asyncio.sleep(STREAM_BUFFER_RESUME_DELAY_SECONDS)
+        finally:
+            if self.cache_fill is not None:
+                self.cache_fill.abort() # No-op once committed
+            
+            self._finish()
+
+def get_response_total_size(response: ClientResponse, offset: int) -> int | None:
+    """ Return the total size in bytes of the resource sent in `response`, requested from byte `offset`, or None if unknown. """
+
+    content_range = response.headers.get("Content-Range")
+    if response.status == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+
+    if response.content_length is not None:
+        return response.content_length if response.status == 200 else offset + response.content_length
+
+    return None
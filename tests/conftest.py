@@ -0,0 +1,6 @@
+""" Shared pytest setup. Makes the project's root modules importable from the tests. """
+
+import sys
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
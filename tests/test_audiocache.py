@@ -0,0 +1,30 @@
+""" Tests for the on-disk audio cache in audiocache.py. """
+
+from audiocache import AudioCache
+
+def fill(cache: AudioCache, key: str, data: bytes, suffix: str="") -> None:
+    cache_fill = cache.open_fill(key, suffix)
+    cache_fill.write(data)
+    assert cache_fill.commit()
+
+def test_cached_file_keeps_its_codec_suffix(tmp_path):
+    cache = AudioCache(str(tmp_path), 1024)
+    fill(cache, "https://youtube.com/watch?v=a", b"opus audio", ".opus")
+    fill(cache, "https://youtube.com/watch?v=b", b"aac audio")
+
+    assert cache.get("https://youtube.com/watch?v=a").endswith(".opus")
+    assert not cache.get("https://youtube.com/watch?v=b").endswith(".opus")
+    assert cache.open_fill("https://youtube.com/watch?v=a", "") is None # Already cached, whatever its codec
+
+    reloaded = AudioCache(str(tmp_path), 1024)
+    assert reloaded.get("https://youtube.com/watch?v=a") == cache.get("https://youtube.com/watch?v=a")
+    assert reloaded.size == len(b"opus audio") + len(b"aac audio")
+
+def test_evicted_file_is_no_longer_found(tmp_path):
+    cache = AudioCache(str(tmp_path), 16)
+    fill(cache, "https://youtube.com/watch?v=a", b"0123456789", ".opus")
+    fill(cache, "https://youtube.com/watch?v=b", b"0123456789")
+
+    assert cache.get("https://youtube.com/watch?v=a") is None
+    assert cache.open_fill("https://youtube.com/watch?v=a", ".opus") is not None
+    assert cache.size == 10
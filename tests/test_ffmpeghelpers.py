@@ -0,0 +1,84 @@
+""" Tests for the audio source selection in helpers/ffmpeghelpers.py.
+
+Importing the helpers loads settings.py, which needs discord.py, yt-dlp and an FFmpeg binary. """
+
+import pytest
+from shutil import which
+
+discord = pytest.importorskip("discord")
+yt_dlp = pytest.importorskip("yt_dlp")
+
+if which("ffmpeg") is None:
+    pytest.skip("FFmpeg binary not found.", allow_module_level=True)
+
+from helpers import ffmpeghelpers
+from helpers.confighelpers import ConfigCategory, get_default_yt_dlp_config_data
+from webextractor import prettify_info
+
+# Audio-only formats of a typical YouTube video, as reported by yt-dlp.
+YOUTUBE_AUDIO_FORMATS = [
+    {"format_id": "139", "ext": "m4a", "acodec": "mp4a.40.5", "vcodec": "none", "abr": 48.8, "protocol": "https", "url": "https://rr1.googlevideo.com/139"},
+    {"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 129.5, "protocol": "https", "url": "https://rr1.googlevideo.com/140"},
+    {"format_id": "250", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 70.2, "protocol": "https", "url": "https://rr1.googlevideo.com/250"},
+    {"format_id": "251", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 135.9, "protocol": "https", "url": "https://rr1.googlevideo.com/251"}
+]
+
+class FakeProcess:
+    stdout = None
+    stdin = None
+
+def select_default_format() -> dict:
+    """ Return the format picked by the default yt-dlp config among `YOUTUBE_AUDIO_FORMATS`. """
+
+    options = get_default_yt_dlp_config_data()[ConfigCategory.YT_DLP.value]
+    with yt_dlp.YoutubeDL(options) as ydl:
+        selector = ydl.build_format_selector(options["format"])
+        context = {"formats": YOUTUBE_AUDIO_FORMATS, "has_merged_format": False, "incomplete_formats": False}
+
+        return next(iter(selector(context)))
+
+def test_default_format_copies_youtube_opus(monkeypatch):
+    selected = select_default_format()
+    info = {
+        "title": "Test track",
+        "uploader": "Test uploader",
+        "duration": 212,
+        "upload_date": "20200101",
+        "webpage_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        **selected
+    }
+    track = prettify_info(info, "YouTube")
+
+    assert selected["acodec"] == "opus"
+    assert ffmpeghelpers.can_copy_opus(track)
+
+    spawned_args = []
+    def spawn_process(self, args, **kwargs):
+        spawned_args.extend(args)
+        return FakeProcess()
+
+    monkeypatch.setattr(ffmpeghelpers, "PLAYBACK_MODE", "opus")
+    monkeypatch.setattr(ffmpeghelpers, "STREAM_BUFFER_SIZE", 0)
+    monkeypatch.setattr(ffmpeghelpers, "AUDIO_CACHE", None)
+    monkeypatch.setattr(discord.FFmpegAudio, "_spawn_process", spawn_process)
+
+    source = ffmpeghelpers.create_audio_source(track, 0)
+
+    assert isinstance(source, discord.FFmpegOpusAudio)
+    assert "-c:a" in spawned_args and spawned_args[spawned_args.index("-c:a") + 1] == "copy"
+
+def test_seeking_picks_input_type(monkeypatch):
+    track = prettify_info({"title": "Test track", "duration": 212, "webpage_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", **YOUTUBE_AUDIO_FORMATS[3]}, "YouTube")
+    session = object() # Only checked for presence
+
+    monkeypatch.setattr(ffmpeghelpers, "STREAM_BUFFER_SIZE", 1024 * 1024)
+
+    assert ffmpeghelpers.get_ffmpeg_input_type(track, 0, None, session) == "pipe"
+    assert ffmpeghelpers.get_ffmpeg_input_type(track, 30, None, session) == "url"
+    assert ffmpeghelpers.get_ffmpeg_input_type(track, 0, None, None) == "url"
+    assert ffmpeghelpers.get_ffmpeg_input_type(track, 30, "/tmp/cached", session) == "file"
+
+    monkeypatch.setattr(ffmpeghelpers, "STREAM_BUFFER_SIZE", 0)
+    monkeypatch.setattr(ffmpeghelpers, "AUDIO_CACHE", None)
+
+    assert ffmpeghelpers.get_ffmpeg_input_type(track, 0, None, session) == "url"
@@ -7,16 +7,29 @@ Supported websites
 - SoundCloud (Songs and sets)
 - Bandcamp (Songs and albums) """
 
-from settings import YDL, CAN_LOG, LOGGER, EXTRACTOR_CACHE, MAX_ITEM_NAME_LENGTH
-from init.logutils import log_to_discord_log
+from settings import (
+    YDL_POOL, EXTRACTOR_PROCESS_POOL, CAN_LOG, LOGGER, EXTRACTOR_CACHE, NEGATIVE_EXTRACTOR_CACHE, METADATA_CACHE, 
+    MAX_ITEM_NAME_LENGTH, LAZY_PLAYLIST_EXTRACTION, ENABLE_NATIVE_EXTRACTORS, SEARCH_RESULTS_CACHE, EXTRACTOR_METRICS
+)
+from init.constants import UNAVAILABLE_CONTENT_ERROR_MARKERS, SEARCH_RESULT_COUNT
+from init.logutils import log, log_to_discord_log
 from helpers.timehelpers import format_to_minutes
-from helpers.cachehelpers import get_cache, store_cache
+from helpers.cachehelpers import get_cache, store_cache, invalidate_cache
+from helpers.httphelpers import http_get_bytes
 from error import Error
 
 import re
+import asyncio
+from aiohttp import ClientSession
+from html import unescape
+from base64 import urlsafe_b64decode
+from json import loads
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 from enum import Enum
-from datetime import datetime, date
-from typing import Any, Literal
+from threading import Event
+from datetime import datetime, date, timezone
+from time import monotonic
+from typing import Any, Awaitable, Callable, Iterator, Literal
 
 SourceWebsiteValue = Literal[
     "YouTube Playlist",
@@ -67,12 +80,23 @@ class QueryType:
     
     `regex`: Regex pattern used to match `query`. Must only be filled if `is_url`=`True`. Otherwise, ValueError will be raised. 
     
-    `search_string`: Search string passed to yt-dlp. Must only be filled if `is_url`=`False`. Otherwise, ValueError will be raised. """
+    `search_string`: Search string passed to yt-dlp. Must only be filled if `is_url`=`False`. Otherwise, ValueError will be raised. 
+    
+    `canonical_query`: Normalized identity of `query`, used for extraction, caching and deduplication. Defaults to `query`. """
 
-    def __init__(self, query: str, source_website: SourceWebsiteValue | None, is_url: bool, regex: re.Pattern | None=None, search_string: str | None=None):
+    def __init__(
+            self, 
+            query: str, 
+            source_website: SourceWebsiteValue | None, 
+            is_url: bool, 
+            regex: re.Pattern | None=None, 
+            search_string: str | None=None, 
+            canonical_query: str | None=None
+        ):
         self.query = query
         self.source_website = source_website
         self.is_url = is_url
+        self.canonical_query = canonical_query or query
 
         if (regex is not None and not self.is_url) or (search_string is not None and self.is_url):
             raise ValueError("Unsupported argument supplied in current condition")
@@ -80,6 +104,65 @@ class QueryType:
         self.regex = regex
         self.search_string = search_string
 
+class Track:
+    """ Track class.
+
+    Compact record of an extracted track. Only holds the fields the bot uses, the rest of the yt-dlp info hashmap is discarded.
+
+    Supports hashmap-style access (`track["title"]`, `track.get("thumbnail")`, `"url" in track`) so it can be used
+    wherever a track hashmap was used before. Assigning a key that is not one of `__slots__` raises KeyError. """
+
+    __slots__ = (
+        "title",
+        "uploader",
+        "duration",
+        "upload_date",
+        "webpage_url",
+        "url",
+        "source_website",
+        "thumbnail",
+        "http_headers",
+        "stream_expires_at",
+        "acodec",
+        "protocol"
+    )
+
+    def __init__(self, **fields: Any):
+        for key in self.__slots__:
+            setattr(self, key, fields.get(key))
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Track):
+            return NotImplemented
+        
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+    
+    __hash__ = None # Mutable like the dicts tracks used to be, so unhashable
+
+    def __repr__(self) -> str:
+        return f"Track(title={self.title!r}, webpage_url={self.webpage_url!r}, source_website={self.source_website!r})"
+
+    def get(self, key: str, default: Any=None) -> Any:
+        """ Return the value of `key`, or `default` if it is not set. """
+
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return value if value is not None else default
+
 # List of regex pattern to match website URLs
 # Second item is the 'source_website' string
 # Remember to update parse_info() after any changes made here.
@@ -102,6 +185,13 @@ SEARCH_PROVIDERS = {
 PLAYLIST_WEBSITES = (SourceWebsite.YOUTUBE_PLAYLIST.value, SourceWebsite.SOUNDCLOUD_PLAYLIST.value, SourceWebsite.BANDCAMP_PLAYLIST.value)
 SEARCH_WEBSITES = (SourceWebsite.YOUTUBE_SEARCH.value, SourceWebsite.SOUNDCLOUD_SEARCH.value)
 
+# Playlists that can be extracted flat (metadata only) when lazy playlist extraction is enabled.
+# Their stream URLs are resolved right before playback.
+# SoundCloud sets and Bandcamp albums are excluded because their flat entries carry no duration or uploader,
+# their tracks are fully resolved before being queued instead.
+LAZY_PLAYLIST_WEBSITES = (SourceWebsite.YOUTUBE_PLAYLIST.value,)
+FLAT_PLAYLIST_PARAMS = {"extract_flat": "in_playlist"}
+
 BANDCAMP_DOMAINS = (SourceWebsite.BANDCAMP.value, SourceWebsite.BANDCAMP_PLAYLIST.value)
 SOUNDCLOUD_DOMAINS = (SourceWebsite.SOUNDCLOUD.value, SourceWebsite.SOUNDCLOUD_PLAYLIST.value, SourceWebsite.SOUNDCLOUD_SEARCH.value)
 YOUTUBE_DOMAINS = (SourceWebsite.YOUTUBE.value, SourceWebsite.YOUTUBE_PLAYLIST.value, SourceWebsite.YOUTUBE_SEARCH.value)
@@ -118,24 +208,124 @@ FAST_SEEK_SUPPORT_DOMAINS = (
     SourceWebsite.NEWGROUNDS.value
 )
 
+# Query parameters that identify a resource, per host and path. Any other parameter (tracking, index, timestamps, ...) is dropped by canonicalize_url().
+# Hosts and paths not listed here keep no query parameters at all.
+IDENTITY_QUERY_PARAMS = {
+    ("youtube.com", "/watch"): ("v",),
+    ("youtube.com", "/playlist"): ("list",)
+}
+
+# Keys stored in the persistent metadata cache. Must be JSON-serializable once prettified.
+METADATA_KEYS = ("title", "uploader", "duration", "webpage_url", "upload_date")
+
+# Exceptions re-raised by extractor worker processes are formatted as "<class name>: <message>"
+WORKER_EXCEPTION_PATTERN = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*): ")
+
+# Keys of a track saved in a playlist.
+PLAYLIST_TRACK_KEYS = ("title", "uploader", "duration", "webpage_url", "source_website")
+
+def canonicalize_url(url: str) -> str:
+    """ Return a normalized identity of `url`, so every variant of a resource URL maps to the same string.
+
+    The scheme is forced to https, the host is lowercased and stripped of `www.`, 
+    query parameters not listed in `IDENTITY_QUERY_PARAMS`, fragments and trailing slashes are removed. """
+
+    if "://" not in url:
+        url = "https://" + url
+
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url
+
+    host = parsed.netloc.lower().removeprefix("www.")
+    path = parsed.path.rstrip("/")
+
+    kept_params = IDENTITY_QUERY_PARAMS.get((host, path), ())
+    params = parse_qs(parsed.query)
+    query = urlencode([(name, params[name][0]) for name in kept_params if name in params])
+
+    return urlunparse(("https", host, path, "", query, ""))
+
+def normalize_search_query(query: str) -> str:
+    """ Return `query` with its case and whitespace folded, so near-identical searches share the same identity. """
+
+    return " ".join(query.split()).casefold()
+
+def get_search_url(query_type: QueryType, count: int=SEARCH_RESULT_COUNT) -> str:
+    """ Return the yt-dlp URL searching the top `count` results of a search query (e.g. `ytsearch5:query`). """
+
+    return query_type.search_string.removesuffix(":") + f"{count}:{query_type.canonical_query}"
+
 def get_query_type(query: str, provider: SearchWebsiteIDValue | None) -> QueryType:
     """ Match a regex pattern to a user-given query, so we know what kind of query we're working with. 
 
     `provider` is the optional search provider to use when queries don't match the supported regex patterns.
     
-    Returns a QueryType object. """
+    Returns a QueryType object. URLs and searches get a canonical identity (see `canonicalize_url()` and `normalize_search_query()`). """
 
     # Match URLs first.
     for regex, source_website in URL_PATTERNS:
         if regex.match(query):
-            return QueryType(query, source_website, True, regex)
+            return QueryType(query, source_website, True, regex, canonical_query=canonicalize_url(query))
 
     # If no matches are found, match a search query. If not found, default to youtube.
     provider_info = SEARCH_PROVIDERS.get(provider, SEARCH_PROVIDERS[SearchWebsiteID.YOUTUBE_SEARCH.value])
     provider_search_string = provider_info[0]
     provider_source_website = provider_info[1]
 
-    return QueryType(query, provider_source_website, False, None, provider_search_string)
+    return QueryType(query, provider_source_website, False, None, provider_search_string, canonical_query=normalize_search_query(query))
+
+# Query parameters holding a UNIX timestamp after which a signed stream URL stops working.
+# 'expire' is used by googlevideo (YouTube), the rest by various signed CDN URLs.
+STREAM_URL_EXPIRY_PARAMS = ("expire", "expires", "Expires", "exp")
+
+def _parse_timestamp(value: str | int | float | None) -> float | None:
+    """ Return `value` as a UNIX timestamp in seconds, or None if it is not one. """
+
+    try:
+        timestamp = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    if timestamp > 1e12: # Milliseconds
+        timestamp /= 1000
+
+    return timestamp if timestamp > 0 else None
+
+def get_stream_url_expiry(url: str | None) -> float | None:
+    """ Return the UNIX timestamp a signed stream URL expires at, if it can be found in the URL.
+
+    Supported hints:
+    - `expire=`/`expires=`/`exp=` query parameters (YouTube and generic signed URLs).
+    - CloudFront `Policy=` parameters (SoundCloud), whose base64 JSON policy contains an `AWS:EpochTime` expiry.
+    - `token=<timestamp>_<signature>` query parameters (Bandcamp). """
+
+    if not url:
+        return None
+
+    try:
+        params = parse_qs(urlparse(url).query)
+    except ValueError:
+        return None
+
+    for name in STREAM_URL_EXPIRY_PARAMS:
+        if name in params:
+            return _parse_timestamp(params[name][0])
+
+    if "Policy" in params:
+        try:
+            policy = params["Policy"][0].replace("~", "=")
+            policy = loads(urlsafe_b64decode(policy + "=" * (-len(policy) % 4)))
+
+            return _parse_timestamp(policy["Statement"][0]["Condition"]["DateLessThan"]["AWS:EpochTime"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+    if "token" in params:
+        return _parse_timestamp(params["token"][0].split("_", 1)[0])
+
+    return None
 
 def prettify_date(date: str) -> date | str:
     """ Parse given `date` into a date object when possible. Non-string `date` is assumed as a date object. """
@@ -159,30 +349,163 @@ def prettify_duration(duration: str | float | int) -> str:
     else:
         return duration
 
-def prettify_info(info: dict[str, Any], source_website: SourceWebsiteValue | None=None) -> dict[str, Any]:
-    """ Prettify the extracted info with cleaner values. 
+def prettify_info(info: dict[str, Any], source_website: SourceWebsiteValue | None=None) -> Track:
+    """ Prettify the extracted info with cleaner values and return it as a compact Track. 
     
-    Prettify duration as a HH:MM:SS string and date as a date object. """
+    Prettify duration as a HH:MM:SS string and date as a date object and store the stream URL expiry (if known) in `stream_expires_at`. 
+    The stream's audio codec and protocol are kept in `acodec` and `protocol`, to tell whether it can be played without re-encoding. 
+    Every other key of `info` is dropped. """
     
     upload_date = info.get("upload_date", "19700101") # Default to UNIX epoch because why not
     duration = info.get("duration", 0)
 
-    info["upload_date"] = prettify_date(upload_date)
-    info["duration"] = prettify_duration(duration)
-    info["uploader"] = info.get("uploader") or "Unknown" # Some newgrounds tracks fail to get uploader, better to display as 'unknown' than 'None'
-    info["source_website"] = source_website or "Unknown"
+    return Track(
+        title=info.get("title"),
+        uploader=info.get("uploader") or "Unknown", # Some newgrounds tracks fail to get uploader, better to display as 'unknown' than 'None'
+        duration=prettify_duration(duration),
+        upload_date=prettify_date(upload_date),
+        webpage_url=info.get("webpage_url"),
+        url=info.get("url"),
+        source_website=source_website or "Unknown",
+        thumbnail=info.get("thumbnail"),
+        http_headers=info.get("http_headers") or None,
+        stream_expires_at=get_stream_url_expiry(info.get("url")),
+        acodec=info.get("acodec"),
+        protocol=info.get("protocol")
+    )
 
-    return info
+def get_lazy_entry(entry: dict[str, Any]) -> dict[str, Any]:
+    """ Convert a flat playlist entry into a track without a stream URL (`url` is None).
+
+    The stream URL is resolved right before playback by the stream checks. """
+
+    thumbnails = entry.get("thumbnails")
+    timestamp = _parse_timestamp(entry.get("timestamp"))
+
+    lazy_entry = {
+        "title": entry.get("title") or entry.get("url"),
+        "uploader": entry.get("uploader") or entry.get("channel"),
+        "duration": entry.get("duration"),
+        "upload_date": entry.get("upload_date") or (datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%d") if timestamp else None),
+        "webpage_url": entry.get("webpage_url") or entry.get("url"),
+        "thumbnail": entry.get("thumbnail") or (thumbnails[-1].get("url") if thumbnails else None)
+    }
+
+    lazy_entry = {key: value for key, value in lazy_entry.items() if value is not None} # Let prettify_info() fill in defaults
+    lazy_entry["url"] = None
+
+    return lazy_entry
+
+def get_track_metadata(info: Track) -> dict[str, Any]:
+    """ Return the stable, JSON-serializable metadata of a prettified track. """
 
-def parse_info(info: dict[str, Any], query: str, query_type: QueryType) -> dict[str, Any] | list[dict[str, Any]] | Error:
-    """ Parse extracted query in a readable/playable format for the VoiceClient. """
+    metadata = {key: info.get(key) for key in METADATA_KEYS}
+    if isinstance(metadata["upload_date"], date):
+        metadata["upload_date"] = metadata["upload_date"].strftime("%Y%m%d")
+
+    return metadata
+
+def store_metadata(key: str, info: Track | list[Track]) -> None:
+    """ Store the metadata of a prettified track or list of tracks in the persistent metadata cache, if enabled. """
+
+    if METADATA_CACHE is None:
+        return
+
+    metadata = [get_track_metadata(entry) for entry in info] if isinstance(info, list) else get_track_metadata(info)
+    METADATA_CACHE.store(key, metadata)
+
+def get_cache_key(query_type: QueryType, max_entries: int | None=None) -> str:
+    """ Return the key a query is cached under, based on its canonical identity. 
+    
+    Playlists extracted with an entry budget (`max_entries`) are cached apart from full playlists. """
+
+    cache_key = query_type.canonical_query + f"::{query_type.source_website}"
+    if max_entries is not None and query_type.source_website in PLAYLIST_WEBSITES:
+        cache_key += f"::{max_entries}"
+
+    return cache_key
+
+def get_cached_tracks(query_type: QueryType, max_entries: int | None=None) -> Track | list[Track] | None:
+    """ Return the cached extraction result of a query, or None if not cached.
+
+    A budgeted playlist is also served from a cached full extraction of the same playlist. """
+
+    cache = get_cache(EXTRACTOR_CACHE, get_cache_key(query_type, max_entries))
+    if cache is None and max_entries is not None and query_type.source_website in PLAYLIST_WEBSITES:
+        full_playlist = get_cache(EXTRACTOR_CACHE, get_cache_key(query_type))
+        cache = full_playlist[:max_entries] if full_playlist is not None else None
+
+    return cache
+
+def get_failure_reason(error: Exception) -> str:
+    """ Return the negative cache reason of an extraction exception: `unavailable` if the content itself can't be extracted, `transient` otherwise. """
+
+    message = str(error).lower()
+
+    if any(marker in message for marker in UNAVAILABLE_CONTENT_ERROR_MARKERS):
+        return "unavailable"
+    
+    return "transient"
+
+def store_failure(cache_key: str, error: Error, reason: str, source_website: SourceWebsiteValue) -> Error:
+    """ Store a failed extraction in the negative cache for the TTL of `reason`, count it in the extractor metrics and return `error`. """
+
+    store_cache((reason, error), cache_key, NEGATIVE_EXTRACTOR_CACHE)
+    EXTRACTOR_METRICS.increment(f"errors.{reason}", source_website)
+
+    return error
+
+def record_exception(source_website: SourceWebsiteValue, error: Exception) -> None:
+    """ Count an extraction exception by class in the extractor metrics. 
+    
+    Exceptions re-raised by extractor worker processes are counted by their original class. """
+
+    name = error.__class__.__name__
+    if isinstance(error, RuntimeError):
+        match = WORKER_EXCEPTION_PATTERN.match(str(error))
+        if match:
+            name = match.group(1)
+
+    EXTRACTOR_METRICS.increment(f"exceptions.{name}", source_website)
+
+def get_cached_failure(query_type: QueryType, max_entries: int | None=None) -> Error | None:
+    """ Return the Error of a recently failed extraction of a query, or None if it didn't fail recently. """
+
+    failure = get_cache(NEGATIVE_EXTRACTOR_CACHE, get_cache_key(query_type, max_entries))
+    if failure is None:
+        return None
+    
+    EXTRACTOR_METRICS.increment("negative_cache_hits", query_type.source_website)
+    
+    return failure[1]
+
+def get_extraction_params(query_type: QueryType, max_entries: int | None=None) -> dict[str, Any] | None:
+    """ Return the extra YoutubeDL options to extract a query with, or None if there are none. 
+    
+    Lazy playlists are extracted flat, and playlists with an entry budget stop at entry `max_entries`. """
+
+    params = {}
+
+    if LAZY_PLAYLIST_EXTRACTION and query_type.source_website in LAZY_PLAYLIST_WEBSITES:
+        params.update(FLAT_PLAYLIST_PARAMS)
+
+    if max_entries is not None and query_type.source_website in PLAYLIST_WEBSITES:
+        params["playlistend"] = max_entries
+
+    return params or None
+
+def parse_info(info: dict[str, Any], query: str, query_type: QueryType, is_flat: bool=False) -> Track | list[Track] | Error:
+    """ Parse extracted query in a readable/playable format for the VoiceClient. 
+    
+    `is_flat` must be True if `info` is a flat playlist extraction, its entries are then converted to tracks without a stream URL. """
 
     # If it's a playlist, prettify each entry and return
     if query_type.source_website in PLAYLIST_WEBSITES and "entries" in info:
-        if len(info["entries"]) == 0:
+        entries = [entry for entry in info["entries"] if entry is not None]
+        if len(entries) == 0:
             return Error(f"No results found for query `{query[:MAX_ITEM_NAME_LENGTH]}`.")
         
-        return [prettify_info(entry, query_type.source_website) for entry in info["entries"] if entry is not None]
+        return [prettify_info(entry if not is_flat else get_lazy_entry(entry), query_type.source_website) for entry in entries]
 
     # If it's a search, prettify the first entry and return
     if query_type.source_website in SEARCH_WEBSITES and "entries" in info:
@@ -196,33 +519,511 @@ def parse_info(info: dict[str, Any], query: str, query_type: QueryType) -> dict[
     # URLs are directly prettified.
     return prettify_info(info, query_type.source_website)
 
-def fetch(query: str, query_type: QueryType, allow_cache: bool=True) -> dict[str, Any] | list[dict[str, Any]] | Error:
+def extract_info(url: str, params: dict[str, Any] | None=None, abort: Event | None=None, process: bool=True) -> dict[str, Any] | None:
+    """ Extract `url` using the configured extractor backend.
+
+    `params` are extra YoutubeDL options applied to this extraction only.
+    If `process` is False, the info is returned as given by the site's extractor: formats and stream URLs are not resolved, nested URLs are not followed.
+
+    With the `process` backend, the calling thread waits for a worker process to extract `url` and gets back a compact info hashmap.
+    Setting `abort` kills the worker and raises InterruptedError.
+    Otherwise, a YoutubeDL instance is checked out from the pool and used in the calling thread. `abort` is ignored, as threads can't be killed. """
+
+    if EXTRACTOR_PROCESS_POOL is not None:
+        return EXTRACTOR_PROCESS_POOL.run(url, params, abort, process)
+
+    with YDL_POOL.checkout(params) as ydl:
+        return ydl.extract_info(url, download=False, process=process)
+
+def search(query: str, query_type: QueryType, allow_cache: bool=True, abort: Event | None=None) -> list[Track] | Error:
+    """ Find the top `SEARCH_RESULT_COUNT` results of a search query and return them as tracks without a stream URL (`url` is None).
+
+    The search is extracted flat and its result set is cached under the query's canonical identity (see `normalize_search_query()`),
+    so repeated and near-identical searches are served without searching again. 
+    
+    Must be sent to a thread if working with an asyncio loop. """
+
+    cache_key = get_cache_key(query_type)
+
+    if allow_cache:
+        results = get_cache(SEARCH_RESULTS_CACHE, cache_key)
+        if results is not None:
+            EXTRACTOR_METRICS.increment("search_cache_hits", query_type.source_website)
+            return results
+        
+    EXTRACTOR_METRICS.increment("search_cache_misses", query_type.source_website)
+    start = monotonic()
+        
+    try:
+        info = extract_info(get_search_url(query_type), FLAT_PLAYLIST_PARAMS, abort)
+    except InterruptedError:
+        return Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` was stopped.")
+    except Exception as e:
+        log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+        record_exception(query_type.source_website, e)
+
+        error = Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        return store_failure(cache_key, error, get_failure_reason(e), query_type.source_website)
+    finally:
+        EXTRACTOR_METRICS.observe("search_seconds", query_type.source_website, monotonic() - start)
+    
+    entries = [entry for entry in (info or {}).get("entries", ()) if entry is not None and (entry.get("webpage_url") or entry.get("url"))]
+    if not entries:
+        return store_failure(cache_key, Error(f"No results found for query `{query[:MAX_ITEM_NAME_LENGTH]}`."), "no_results", query_type.source_website)
+    
+    results = [prettify_info(get_lazy_entry(entry), query_type.source_website) for entry in entries]
+    store_cache(results, cache_key, SEARCH_RESULTS_CACHE)
+
+    return results
+
+def fetch(
+        query: str, 
+        query_type: QueryType, 
+        allow_cache: bool=True, 
+        max_entries: int | None=None, 
+        abort: Event | None=None
+    ) -> Track | list[Track] | Error:
     """ Search a webpage and find info about the query.
 
     Must be sent to a thread if working with an asyncio loop, as the web requests block the main thread. 
     
-    Return a single hashmap containing a media URL readable by FFmpeg and optional metadata or a list of the same type if `query` is a playlist URL. """
+    Search queries are resolved to their top result's webpage URL, which is then extracted directly. 
+    The URL comes from the persistent metadata cache if known, or from the search result set (see `search()`), skipping the search on hits.
+
+    Single track URLs known to the persistent metadata cache are not extracted: their track is returned without a stream URL (`url` is None),
+    which is resolved right before playback. Playlists are always extracted, as their entries may have changed since they were cached.
+
+    If lazy playlist extraction is enabled, supported playlists are extracted flat and their tracks have no stream URL (`url` is None).
+
+    `max_entries` is the maximum amount of playlist entries to extract, entries past it are never resolved. Ignored for non-playlist queries.
+
+    Failed extractions are stored in the negative cache with a TTL depending on the failure reason (see `get_cached_failure()`), but never read from it here.
+
+    `abort` may be set by another thread to abort the extraction (`process` extractor backend only).
+
+    Return a single Track containing a media URL readable by FFmpeg and optional metadata or a list of the same type if `query` is a playlist URL. """
     
+    cache_key = get_cache_key(query_type, max_entries)
+
     if allow_cache:
-        cache = get_cache(EXTRACTOR_CACHE, query + f"::{query_type.source_website}")
+        cache = get_cached_tracks(query_type, max_entries)
         if cache is not None:
+            EXTRACTOR_METRICS.increment("cache_hits", query_type.source_website)
             return cache
+        
+        EXTRACTOR_METRICS.increment("cache_misses", query_type.source_website)
 
-    try:
-        if not query_type.is_url:
-            info = YDL.extract_info(query_type.search_string + query, download=False)
+    url = query_type.canonical_query
+    metadata = METADATA_CACHE.get(cache_key) if allow_cache and METADATA_CACHE is not None else None
+
+    if query_type.is_url:
+        if isinstance(metadata, dict) and metadata.get("webpage_url") and query_type.source_website not in PLAYLIST_WEBSITES:
+            EXTRACTOR_METRICS.increment("metadata_cache_hits", query_type.source_website)
+            return prettify_info(dict(metadata, url=None), query_type.source_website) # Stream resolved right before playback
+    else:
+        if isinstance(metadata, dict) and metadata.get("webpage_url"):
+            url = metadata["webpage_url"]
         else:
-            info = YDL.extract_info(query, download=False)
+            results = search(query, query_type, allow_cache, abort)
+            if isinstance(results, Error):
+                return results
+            
+            url = results[0]["webpage_url"] # Extract the top result directly
+
+    is_flat = LAZY_PLAYLIST_EXTRACTION and query_type.source_website in LAZY_PLAYLIST_WEBSITES
+    start = monotonic()
+
+    try:
+        info = extract_info(url, get_extraction_params(query_type, max_entries), abort)
+    except InterruptedError:
+        return Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` was stopped.") # Not a failure of the query itself
     except Exception as e:
         log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+        record_exception(query_type.source_website, e)
 
-        return Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        error = Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        return store_failure(cache_key, error, get_failure_reason(e), query_type.source_website)
+    finally:
+        EXTRACTOR_METRICS.observe("extraction_seconds", query_type.source_website, monotonic() - start)
 
     if info is not None:
-        prettified_info = parse_info(info, query, query_type)
-        if not isinstance(prettified_info, Error):
-            store_cache(prettified_info, query + f"::{query_type.source_website}", EXTRACTOR_CACHE)
+        prettified_info = parse_info(info, query, query_type, is_flat)
+        if isinstance(prettified_info, Error):
+            return store_failure(cache_key, prettified_info, "no_results", query_type.source_website)
+        
+        if isinstance(prettified_info, list):
+            EXTRACTOR_METRICS.observe("playlist_entries", query_type.source_website, len(prettified_info))
+        
+        store_cache(prettified_info, cache_key, EXTRACTOR_CACHE)
+        store_metadata(cache_key, prettified_info)
+        invalidate_cache(cache_key, NEGATIVE_EXTRACTOR_CACHE)
         
         return prettified_info
     
-    return Error(f"An error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`.")
\ No newline at end of file
+    return store_failure(cache_key, Error(f"An error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`."), "transient", query_type.source_website)
+
+def iter_playlist(
+        query: str, 
+        query_type: QueryType, 
+        max_entries: int | None=None, 
+        abort: Event | None=None
+    ) -> Iterator[tuple[int, int, Track] | Error]:
+    """ Extract a playlist URL one entry at a time.
+
+    Yield a `(position, total, track)` tuple as soon as each entry is extracted, or an Error if the extraction fails. 
+    Tracks already yielded stay valid after an Error. `total` is the playlist length if known, otherwise `position`.
+
+    At most `max_entries` tracks are extracted, if given. `abort` is passed to `fetch()` when the whole playlist is extracted first.
+
+    The playlist is only resolved incrementally with the `thread` backend and non-lazy playlists. Cached playlists, 
+    lazy (flat) playlists and the `process` backend extract the whole playlist with `fetch()` first, then yield its tracks.
+
+    Failures are stored in the negative cache unless some tracks were already yielded.
+
+    Every step blocks on web requests and must be sent to a thread if working with an asyncio loop. 
+    The generator must be closed (or exhausted) to check its YoutubeDL instance back in. """
+
+    cache_key = get_cache_key(query_type, max_entries)
+    is_flat = LAZY_PLAYLIST_EXTRACTION and query_type.source_website in LAZY_PLAYLIST_WEBSITES
+
+    if EXTRACTOR_PROCESS_POOL is not None or is_flat or get_cached_tracks(query_type, max_entries) is not None:
+        result = fetch(query, query_type, max_entries=max_entries, abort=abort)
+
+        if isinstance(result, Error):
+            yield result
+            return
+
+        tracks = result if isinstance(result, list) else [result]
+        for position, track in enumerate(tracks, start=1):
+            yield position, len(tracks), track
+
+        return
+
+    tracks = []
+
+    try:
+        with YDL_POOL.checkout() as ydl:
+            info = ydl.extract_info(query_type.canonical_query, download=False, process=False) # Entries are left unresolved
+
+            entries = info.get("entries") if info is not None else None
+            total = info.get("playlist_count") if info is not None else None
+
+            if total is not None and max_entries is not None:
+                total = min(total, max_entries)
+
+            for position, entry in enumerate(entries or (), start=1):
+                if max_entries is not None and position > max_entries:
+                    break # Don't resolve entries past the budget
+                elif entry is None:
+                    continue
+
+                entry = ydl.process_ie_result(entry, download=False)
+                if entry is None:
+                    continue
+                
+                track = prettify_info(entry, query_type.source_website)
+                tracks.append(track)
+
+                yield position, max(total or 0, position), track
+    except Exception as e:
+        log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+        record_exception(query_type.source_website, e)
+
+        error = Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        if not tracks:
+            store_failure(cache_key, error, get_failure_reason(e), query_type.source_website) # Don't hide the entries that did work
+        
+        yield error
+        return
+
+    if not tracks:
+        yield store_failure(cache_key, Error(f"No results found for query `{query[:MAX_ITEM_NAME_LENGTH]}`."), "no_results", query_type.source_website)
+        return
+
+    EXTRACTOR_METRICS.observe("playlist_entries", query_type.source_website, len(tracks))
+
+    store_cache(tracks, cache_key, EXTRACTOR_CACHE)
+    store_metadata(cache_key, tracks)
+    invalidate_cache(cache_key, NEGATIVE_EXTRACTOR_CACHE)
+
+def get_playlist_track(track: Track | dict[str, Any], source_website: SourceWebsiteValue | None=None) -> dict[str, Any]:
+    """ Return a hashmap holding only the `PLAYLIST_TRACK_KEYS` of `track`. `source_website` is used if `track` has none. """
+
+    playlist_track = {key: track.get(key) for key in PLAYLIST_TRACK_KEYS}
+    playlist_track["source_website"] = playlist_track["source_website"] or source_website or "Unknown"
+
+    return playlist_track
+
+def fetch_metadata(
+        query: str, 
+        query_type: QueryType, 
+        allow_cache: bool=True, 
+        max_entries: int | None=None, 
+        abort: Event | None=None
+    ) -> dict[str, Any] | list[dict[str, Any]] | Error:
+    """ Like `fetch()`, but only find the metadata a playlist needs and return it as playlist tracks (see `get_playlist_track()`).
+
+    Stream URLs are never resolved when avoidable:
+    - Cached extractions are used first. Persistent metadata cache entries as well, except for playlists, whose entries may have changed.
+    - Lazy playlists (see `LAZY_PLAYLIST_WEBSITES`) are extracted flat, without processing their entries' formats. Searches use the cached result set (see `search()`).
+    - Single track URLs are extracted without processing their formats (see `fetch_track_metadata()`).
+    - Anything else (playlists whose flat entries lack metadata) falls back to `fetch()`. """
+
+    cache_key = get_cache_key(query_type, max_entries)
+
+    if allow_cache:
+        cache = get_cached_tracks(query_type, max_entries)
+        if cache is not None:
+            EXTRACTOR_METRICS.increment("cache_hits", query_type.source_website)
+            return [get_playlist_track(track) for track in cache] if isinstance(cache, list) else get_playlist_track(cache)
+        
+        metadata = METADATA_CACHE.get(cache_key) if METADATA_CACHE is not None and query_type.source_website not in PLAYLIST_WEBSITES else None
+        if metadata:
+            EXTRACTOR_METRICS.increment("metadata_cache_hits", query_type.source_website)
+            
+            if isinstance(metadata, list):
+                return [get_playlist_track(entry, query_type.source_website) for entry in metadata]
+            
+            return get_playlist_track(metadata, query_type.source_website)
+
+    if not query_type.is_url:
+        results = search(query, query_type, allow_cache, abort)
+        if isinstance(results, Error):
+            return results
+        
+        store_metadata(cache_key, results[0])
+        
+        return get_playlist_track(results[0])
+    elif query_type.source_website not in PLAYLIST_WEBSITES:
+        return fetch_track_metadata(query, query_type, allow_cache, abort)
+    elif query_type.source_website not in LAZY_PLAYLIST_WEBSITES:
+        return fetch_metadata_fallback(query, query_type, allow_cache, max_entries, abort)
+
+    params = dict(FLAT_PLAYLIST_PARAMS)
+    if max_entries is not None:
+        params["playlistend"] = max_entries
+
+    start = monotonic()
+
+    try:
+        info = extract_info(query_type.canonical_query, params, abort)
+    except InterruptedError:
+        return Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` was stopped.")
+    except Exception as e:
+        log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+        record_exception(query_type.source_website, e)
+
+        error = Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        return store_failure(cache_key, error, get_failure_reason(e), query_type.source_website)
+    finally:
+        EXTRACTOR_METRICS.observe("extraction_seconds", query_type.source_website, monotonic() - start)
+
+    entries = [entry for entry in (info or {}).get("entries", ()) if entry is not None]
+
+    if not entries:
+        return store_failure(cache_key, Error(f"No results found for query `{query[:MAX_ITEM_NAME_LENGTH]}`."), "no_results", query_type.source_website)
+    elif any(not entry.get("title") for entry in entries):
+        return fetch_metadata_fallback(query, query_type, allow_cache, max_entries, abort) # Some extractors only give URLs in flat mode
+
+    tracks = [prettify_info(get_lazy_entry(entry), query_type.source_website) for entry in entries]
+    EXTRACTOR_METRICS.observe("playlist_entries", query_type.source_website, len(tracks))
+    store_metadata(cache_key, tracks)
+    
+    return [get_playlist_track(track) for track in tracks]
+
+def fetch_track_metadata(query: str, query_type: QueryType, allow_cache: bool=True, abort: Event | None=None) -> dict[str, Any] | Error:
+    """ Find the metadata of a single track URL and return it as a playlist track.
+
+    The URL is extracted without processing (see `extract_info()`), so its formats and stream URL are never resolved.
+    Falls back to `fetch()` if the site's extractor only points to another URL or gives no title. """
+
+    cache_key = get_cache_key(query_type)
+    start = monotonic()
+
+    try:
+        info = extract_info(query_type.canonical_query, None, abort, process=False)
+    except InterruptedError:
+        return Error(f"Extraction of `{query[:MAX_ITEM_NAME_LENGTH]}` was stopped.")
+    except Exception as e:
+        log_to_discord_log(e, can_log=CAN_LOG, logger=LOGGER)
+        record_exception(query_type.source_website, e)
+
+        error = Error(f"An internal error occurred while extracting `{query[:MAX_ITEM_NAME_LENGTH]}`. Please try another source website.")
+        return store_failure(cache_key, error, get_failure_reason(e), query_type.source_website)
+    finally:
+        EXTRACTOR_METRICS.observe("extraction_seconds", query_type.source_website, monotonic() - start)
+
+    if info is None or info.get("_type", "video") != "video" or not info.get("title"):
+        return fetch_metadata_fallback(query, query_type, allow_cache, None, abort)
+    
+    track = prettify_info(get_lazy_entry(info), query_type.source_website)
+    store_metadata(cache_key, track)
+
+    return get_playlist_track(track)
+
+def fetch_metadata_fallback(
+        query: str, 
+        query_type: QueryType, 
+        allow_cache: bool=True, 
+        max_entries: int | None=None, 
+        abort: Event | None=None
+    ) -> dict[str, Any] | list[dict[str, Any]] | Error:
+    """ Find the metadata of a query with a full `fetch()` and return it as playlist tracks. """
+
+    result = fetch(query, query_type, allow_cache, max_entries, abort)
+
+    if isinstance(result, list):
+        return [get_playlist_track(track) for track in result]
+    elif isinstance(result, Track):
+        return get_playlist_track(result)
+    
+    return result
+
+# Native extractors
+# Async extractors for websites whose stream URL and metadata sit in the page itself.
+# An extractor takes the HTTP session and a canonical URL, and returns a yt-dlp-like info hashmap or None if the page can't be read.
+NativeExtractor = Callable[[ClientSession, str], Awaitable[dict[str, Any] | None]]
+NATIVE_EXTRACTORS: dict[SourceWebsiteValue, NativeExtractor] = {}
+
+NEWGROUNDS_MEDIA_URL_PATTERN = re.compile(r'"url"\s*:\s*("[^"]+"),')
+NEWGROUNDS_UPLOADER_PATTERN = re.compile(r'(?:Author|Writer)\s*<a[^>]+>([^<]+)')
+NEWGROUNDS_DURATION_PATTERN = re.compile(r'"duration"\s*:\s*["\']?(\d+)["\']?')
+BANDCAMP_TRALBUM_PATTERN = re.compile(r'data-tralbum=(["\'])(.+?)\1')
+OG_META_PATTERN = r'<meta\s+property=["\']og:{0}["\']\s+content=(["\'])(.*?)\1'
+
+def register_native_extractor(source_website: SourceWebsiteValue) -> Callable[[NativeExtractor], NativeExtractor]:
+    """ Decorator registering a native extractor for `source_website`. """
+
+    def decorator(extractor: NativeExtractor) -> NativeExtractor:
+        NATIVE_EXTRACTORS[source_website] = extractor
+        return extractor
+    
+    return decorator
+
+def has_native_extractor(query_type: QueryType) -> bool:
+    """ Return whether `query_type` can be extracted by a native extractor. """
+
+    return ENABLE_NATIVE_EXTRACTORS and query_type.is_url and query_type.source_website in NATIVE_EXTRACTORS
+
+def get_og_property(webpage: str, name: str) -> str | None:
+    """ Return the unescaped content of the `og:<name>` meta tag of `webpage`, or None if missing. """
+
+    match = re.search(OG_META_PATTERN.format(name), webpage)
+
+    return unescape(match.group(2)) if match else None
+
+async def get_webpage(session: ClientSession, url: str) -> str | None:
+    """ Return the decoded HTML of `url`, or None if the request failed. """
+
+    response = await http_get_bytes(session, url)
+    if isinstance(response, Error):
+        return None
+    
+    return response.result.decode(response.charset or "utf-8", errors="replace")
+
+@register_native_extractor(SourceWebsite.NEWGROUNDS.value)
+async def extract_newgrounds(session: ClientSession, url: str) -> dict[str, Any] | None:
+    """ Extract a Newgrounds audio page. The stream URL is the first `url` of the embedded player JSON. """
+
+    webpage = await get_webpage(session, url)
+    if webpage is None:
+        return None
+    
+    media_url = NEWGROUNDS_MEDIA_URL_PATTERN.search(webpage)
+    title = get_og_property(webpage, "title")
+    if media_url is None or not title:
+        return None
+    
+    uploader = NEWGROUNDS_UPLOADER_PATTERN.search(webpage)
+    duration = NEWGROUNDS_DURATION_PATTERN.search(webpage)
+
+    return {
+        "title": title,
+        "uploader": unescape(uploader.group(1)).strip() if uploader else None,
+        "duration": int(duration.group(1)) if duration else 0,
+        "webpage_url": url,
+        "url": loads(media_url.group(1)),
+        "thumbnail": get_og_property(webpage, "image"),
+        "acodec": "mp3",
+        "protocol": "https"
+    }
+
+@register_native_extractor(SourceWebsite.BANDCAMP.value)
+async def extract_bandcamp(session: ClientSession, url: str) -> dict[str, Any] | None:
+    """ Extract a Bandcamp track page. Stream URL and metadata come from the `data-tralbum` JSON attribute. """
+
+    webpage = await get_webpage(session, url)
+    if webpage is None:
+        return None
+    
+    tralbum = BANDCAMP_TRALBUM_PATTERN.search(webpage)
+    if tralbum is None:
+        return None
+    
+    tralbum = loads(unescape(tralbum.group(2)))
+    track_info = (tralbum.get("trackinfo") or [None])[0]
+    stream_url = ((track_info or {}).get("file") or {}).get("mp3-128")
+    if stream_url is None:
+        return None # Not streamable (e.g. purchase-only)
+    
+    current = tralbum.get("current") or {}
+    release_date = current.get("release_date") or current.get("publish_date")
+    try:
+        upload_date = datetime.strptime(release_date, "%d %b %Y %H:%M:%S %Z").strftime("%Y%m%d") if release_date else None
+    except ValueError:
+        upload_date = None
+
+    info = {
+        "title": track_info.get("title") or current.get("title"),
+        "uploader": tralbum.get("artist"),
+        "duration": int(track_info.get("duration") or 0),
+        "webpage_url": url,
+        "url": stream_url,
+        "thumbnail": get_og_property(webpage, "image"),
+        "acodec": "mp3",
+        "protocol": "https"
+    }
+    if upload_date is not None:
+        info["upload_date"] = upload_date
+    
+    return info
+
+async def fetch_native(session: ClientSession, query: str, query_type: QueryType, allow_cache: bool=True) -> Track | None:
+    """ Async counterpart of `fetch()` for queries with a native extractor (see `has_native_extractor()`).
+
+    Return None if the query has no native extractor or its page could not be read, `fetch()` must then be used instead. 
+    Failures are never stored in the negative cache, as yt-dlp may still succeed. """
+
+    if not has_native_extractor(query_type):
+        return None
+
+    cache_key = get_cache_key(query_type)
+
+    if allow_cache:
+        cache = get_cache(EXTRACTOR_CACHE, cache_key)
+        if cache is not None:
+            EXTRACTOR_METRICS.increment("cache_hits", query_type.source_website)
+            return cache
+
+    start = monotonic()
+
+    try:
+        info = await NATIVE_EXTRACTORS[query_type.source_website](session, query_type.canonical_query)
+    except Exception as e: # Page layout changed, fall back to yt-dlp
+        log(f"Native extractor for {query_type.source_website} failed to extract `{query}`. Falling back to yt-dlp.\nErr: {e}")
+        record_exception(query_type.source_website, e)
+        info = None
+    finally:
+        EXTRACTOR_METRICS.observe("native_extraction_seconds", query_type.source_website, monotonic() - start)
+    
+    if info is None:
+        EXTRACTOR_METRICS.increment("native_fallbacks", query_type.source_website)
+        return None
+    
+    track = prettify_info(info, query_type.source_website)
+
+    store_cache(track, cache_key, EXTRACTOR_CACHE)
+    invalidate_cache(cache_key, NEGATIVE_EXTRACTOR_CACHE)
+    await asyncio.to_thread(store_metadata, cache_key, track) # Blocking disk I/O
+
+    return track
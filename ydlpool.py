@@ -0,0 +1,119 @@
+""" YoutubeDL pool module for discord.py bot.
+
+A yt_dlp.YoutubeDL object is not meant to be used by multiple threads at once, so every extraction checks out its own instance from a pool.
+
+This module must not import any other project module, as it is also used by extractor worker processes. """
+
+from yt_dlp import YoutubeDL
+from contextlib import contextmanager
+from queue import Queue, Empty
+from threading import Lock
+from typing import Any, Iterator
+
+_WAIT_INTERVAL_SECONDS = 0.5
+_MISSING = object()
+
+class YoutubeDLPool:
+    """ Thread-safe pool of YoutubeDL instances.
+
+    `options`: Options passed to every YoutubeDL instance.
+
+    `size`: Maximum amount of instances alive at the same time. Instances are created on demand.
+
+    `max_uses`: Amount of extractions after which an instance is closed and replaced with a fresh one.
+    This keeps the cookie jar and internal caches of a single instance from growing indefinitely. """
+
+    def __init__(self, options: dict[str, Any], size: int, max_uses: int):
+        self.options = options
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+
+        self._idle = Queue()
+        self._lock = Lock()
+        self._created = 0
+        self._closed = False
+
+    def _acquire(self) -> tuple[YoutubeDL, int]:
+        """ Return an idle instance and its use count, create a new one if the pool is not full or wait for one to be released. """
+
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except Empty:
+                pass
+
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("YoutubeDL pool is closed.")
+
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+
+            if can_create:
+                try:
+                    return YoutubeDL(self.options), 0
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            # Wake up periodically, a recycled instance frees a slot without going back to the idle queue.
+            try:
+                return self._idle.get(timeout=_WAIT_INTERVAL_SECONDS)
+            except Empty:
+                continue
+
+    def _release(self, ydl: YoutubeDL, uses: int) -> None:
+        """ Put an instance back in the pool, or close it if it has reached `max_uses` or the pool is closed. """
+
+        with self._lock:
+            discard = self._closed or uses >= self.max_uses
+            if discard:
+                self._created -= 1
+
+        if discard:
+            ydl.close()
+            return
+
+        self._idle.put((ydl, uses))
+
+    @contextmanager
+    def checkout(self, params: dict[str, Any] | None=None) -> Iterator[YoutubeDL]:
+        """ Check out an instance for the duration of the `with` block. It is checked back in on exit.
+
+        `params` may hold YoutubeDL options that only apply while the instance is checked out (e.g. `extract_flat`). """
+
+        ydl, uses = self._acquire()
+        previous_params = {key: ydl.params.get(key, _MISSING) for key in params} if params else {}
+
+        if params:
+            ydl.params.update(params)
+
+        try:
+            yield ydl
+        finally:
+            for key, value in previous_params.items():
+                if value is _MISSING:
+                    ydl.params.pop(key, None)
+                else:
+                    ydl.params[key] = value
+
+            self._release(ydl, uses + 1)
+
+    def close(self) -> None:
+        """ Close every idle instance. Instances still checked out are closed when released. """
+
+        with self._lock:
+            self._closed = True
+
+        while True:
+            try:
+                ydl, _ = self._idle.get_nowait()
+            except Empty:
+                break
+
+            with self._lock:
+                self._created -= 1
+
+            ydl.close()